@@ -22,7 +22,23 @@
 #
 # JimMaastricht5@gmail.com
 # creates the main web page for the tweeters web site  https://jimmaastricht5-tweetersp-1-main-veglvm.streamlit.app/
+# and the navigation for the pages in the pages folder, diagnostics is only listed when TWEETERS_DIAGNOSTICS=1
+import streamlit as st
 import WebClass
 
-webpage = WebClass.WebPages()
-webpage.main_page()
+
+def main() -> None:
+    webpage = WebClass.WebPages()
+    webpage.main_page()
+    return
+
+
+pages = [st.Page(main, title='Main', default=True),
+         st.Page('pages/2_Last_3_Days.py'),
+         st.Page('pages/3_Trends.py'),
+         st.Page('pages/4_Messages.py'),
+         st.Page('pages/5_Model Test Data Management.py')]
+if WebClass.DIAGNOSTICS_ENABLED:
+    pages.append(st.Page('pages/8_Diagnostics.py'))
+pages.append(st.Page('pages/9_About.py'))
+st.navigation(pages).run()
@@ -23,23 +23,66 @@
 # JimMaastricht5@gmail.com
 # module controls all of the data handling and web page generation for the tweeters web app
 # individual pages create the class and call the corresponding function to generate the page output
-import pandas
+from __future__ import annotations  # annotations are not evaluated so pandas types do not import pandas
+import importlib
+import importlib.util
 import streamlit as st
-import pandas as pd
 import urllib.request
 from urllib.error import HTTPError
 from datetime import datetime
 from datetime import date as dtdate
 from datetime import timedelta
 import pytz
-import plotly.express as px
-from plotly.express import colors
-import matplotlib.colors as mcolors
 import base64
 # from svglib.svglib import svg2rlg
-from PIL import Image
 import io
 import math
+import os
+import sys
+import json
+import tempfile
+import threading
+import time
+import functools
+import hashlib
+import weakref
+from collections import OrderedDict
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+
+
+class LazyModule:
+    """
+    stands in for a module and imports it on first attribute access, keeps pandas, plotly, and pillow off the start
+    up of pages that never use them, e.g., the about page
+    """
+    def __init__(self, name: str) -> None:
+        """
+        :param name: full module name, e.g., plotly.express
+        :return: None
+        """
+        self._name = name
+        self._module = None
+        return
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)  # import lock makes this safe across threads
+        return getattr(self._module, attr)
+
+
+pd = LazyModule('pandas')
+pandas = pd  # module name used in type annotations
+np = LazyModule('numpy')
+px = LazyModule('plotly.express')
+colors = LazyModule('plotly.colors')  # palettes only, does not import plotly express or pandas
+Image = LazyModule('PIL.Image')
+ImageSequence = LazyModule('PIL.ImageSequence')
+pa = LazyModule('pyarrow')
+feather = LazyModule('pyarrow.feather')  # optional, columnar snapshots of large sources are skipped without pyarrow
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None  # checked without importing pyarrow
 
 # list of birds to exclude that prior model displayed and are not valid results
 FILTER_BIRD_NAMES = ['Rock Pigeon', 'Pine Grosbeak', 'Indigo Bunting', 'Eurasian Collared-Dove',
@@ -51,16 +94,1031 @@ FILTER_BIRD_NAMES = ['Rock Pigeon', 'Pine Grosbeak', 'Indigo Bunting', 'Eurasian
                      'Black Phoebe', 'Canada Goose']
 # sample link format https://storage.googleapis.com/tweeterssp-web-site-contents/2022-12-29-11-57-29227.jpg
 
+# palette for species colors in charts, shared by every session
+BIRD_COLORS = [
+    "#F0F8FF", "#FAEBD7", "#00FFFF", "#7FFFD4", "#F0FFFF",
+    "#F5F5DC", "#FFCEF4", "#FFB6C1", "#FFDAB9", "#CD853F",
+    "#F0E68C", "#FFFFE0", "#008B8B", "#9ACD32", "#00BFFF",
+    "#87CEFA", "#7FFFD4", "#66CDAA", "#00CED1", "#90EE90",
+    "#D3D3D3", "#9AC6CD", "#8B8B8B", "#808080", "#9400D3",
+    "#FF1493", "#B22222", "#228B22", "#DAA520", "#800000",
+    "#00008B", "#0000CD", "#0000FF", "#4B0082", "#8B0000",
+    "#808000", "#FFFF00", "#00FF00", "#808080", "#000000",
+    "#8B4513", "#A0522D", "#C0C0C0", "#808080", "#800080",
+    "#FFA500", "#FF4500", "#DA70D6", "#EEE8AA", "#98FB98",
+    "#AFEEEE", "#ADD8E6", "#DDA0DD", "#D8BFD8", "#FF00FF",
+    "#DC143C", "#00FFFF", "#0000FF", "#8A2BE2", "#A52A2A",
+    "#DEB887", "#5F9EA0", "#7FFF00", "#D2691E", "#CD853F",
+    "#FFD700", "#DAA520", "#808000", "#008000", "#800080",
+    "#FF00FF", "#BC8F8F", "#483D8B", "#2F4F4F", "#00CED1",
+    "#9400D3", "#FF1493", "#00BFFF", "#66CDAA", "#008B8B",
+    "#B0C4DE", "#FFFFE0", "#00FF00", "#FF0000", "#8B008B",
+    "#808080", "#9ACD32", "#6B8E23", "#FFA07A", "#20B2AA",
+    "#87CEEB", "#6A5ACD", "#708090", "#778899", "#B0C4DE",
+    "#FFFFE0", "#00FF00", "#FF0000", "#8B008B", "#808080"]
+
+
+def bird_colors(indices) -> list:
+    """
+    palette colors for a range of species positions, positions past the end of the palette get the last color
+    :param indices: iterable of positions, e.g., range(len(common_names))
+    :return: list of hex color strings
+    """
+    return [BIRD_COLORS[min(index, len(BIRD_COLORS) - 1)] for index in indices]
+
+
+# process wide cache settings, ttl values are in seconds by data source
+CACHE_TTL_TODAY = 60  # today's files are appended to all day by the feeder
+CACHE_TTL_PAST_DAY = 24 * 60 * 60  # prior days are complete and rarely change
+CACHE_TTL_HISTORY = 60 * 60  # daily_history.csv is rebuilt periodically
+CACHE_TTL_STALE = 15  # cached rows are served this long when the bucket can not be reached to revalidate them
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # memory bound for all cached frames in the process
+SPECIES_NAMES_MAX = 2048  # labels kept in the species name memo, message labels are free text and never repeat
+SPECIES_COLOR_MAPS_MAX = 64  # species lists with color maps kept, the list changes with new species and windows
+# local columnar snapshots of large sources, bump the version when the prepared layout of a source changes
+SNAPSHOT_DIR = os.environ.get('TWEETERS_SNAPSHOT_DIR', os.path.join(tempfile.gettempdir(), 'tweeters_snapshots'))
+SNAPSHOT_VERSION = 3
+FEEDER_DATA_MAX_AGE = 5 * 60  # seconds before a request reloads the shared feeder data through the cache
+HISTORY_DAYS = int(os.environ.get('TWEETERS_HISTORY_DAYS', 3))  # default number of days of feeder data, today included
+MAX_HISTORY_DAYS = 31  # most days a page lets a visitor select
+# trends chart, points per species before downsampling and the precomputed resolutions
+TREND_MAX_POINTS = 400
+TREND_ROLLUPS = {'Weekly': 'W', 'Monthly': 'MS'}  # resample rule for each rollup, bins are labelled by first day
+TREND_AVERAGES = {'7 Day Average': 7, '28 Day Average': 28}  # rolling window in days
+# model test set sampling
+SAMPLE_MIN_SPECIES_COUNT = 150  # species at or below this may be false positives and are not sampled
+SAMPLE_STRATA = ['Month', 'Hour']  # samples are spread across these columns in proportion to their rows
+SAMPLE_SEED = 2024  # default seed so a test set can be rebuilt exactly
+# seconds between background reloads of today's feeder data, 0 turns the background refresh off
+REFRESH_INTERVAL = int(os.environ.get('TWEETERS_REFRESH_SECONDS', CACHE_TTL_TODAY))
+# charts
+CHART_NBINS = 36  # bars per occurrence chart
+CHART_BIN_MINUTES = [1, 2, 5, 10, 15, 20, 30, 60, 120, 180, 240, 360, 720, 1440]  # date time bin widths
+CACHE_TTL_IMAGE_FOUND = 24 * 60 * 60  # images are never changed once written
+CACHE_TTL_IMAGE_MISSING = 60  # a missing image may still be uploading
+# thumbnails for image grids and the data editor preview column
+THUMBNAIL_SIZE = (240, 240)  # max width and height, aspect ratio is kept
+THUMBNAIL_FORMAT = 'JPEG'  # JPEG or WEBP for still thumbnails, animated thumbnails are always GIF
+THUMBNAIL_QUALITY = 75
+THUMBNAIL_CACHE_MAX_BYTES = 64 * 1024 * 1024  # memory bound for all cached thumbnails in the process
+# web fetch settings
+FETCH_WORKERS = 8  # max concurrent downloads for the process
+THUMBNAIL_WORKERS = 4  # max concurrent thumbnail builds for the process, kept apart from the data file downloads
+FETCH_TIMEOUT = 10  # seconds per request
+FETCH_RETRIES = 2  # retries after the first attempt for transient errors
+FETCH_BACKOFF = 0.5  # seconds to wait before the first retry, doubles on each retry
+FETCH_RETRY_STATUS = (429, 500, 502, 503, 504)  # server errors worth retrying, other 4xx answers are final
+# stage timings, percentiles are over the most recent calls of each stage
+TIMING_WINDOW = 500  # calls kept per stage
+TIMING_LOG = os.environ.get('TWEETERS_TIMING_LOG', '0') == '1'  # print a json line for every timed call
+DIAGNOSTICS_ENABLED = os.environ.get('TWEETERS_DIAGNOSTICS', '0') == '1'  # show the diagnostics page
+
+
+class DataCache:
+    """
+    thread safe, process wide cache for downloaded and parsed data shared by all streamlit sessions.
+    entries are keyed by url and date, expire after a per entry ttl, and the least recently used entries are
+    evicted once the total size of the cache grows past max_bytes.  expired entries are kept along with their http
+    validators (etag, last-modified) so the caller can revalidate them with a conditional request instead of
+    downloading and parsing the file again.  cached values are shared, treat them as read only
+    """
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        """
+        :param max_bytes: max size in bytes of all values held in the cache
+        :return: None
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key: (value, expires at, size, validators), least to most recently used
+        self._lock = threading.Lock()
+        return
+
+    @staticmethod
+    def size_of(value) -> int:
+        """
+        estimate the memory used by a cached value
+        :param value: object to size
+        :return: size in bytes
+        """
+        if 'pandas' in sys.modules and isinstance(value, pd.DataFrame):  # a df means pandas is already loaded
+            return int(value.memory_usage(index=True, deep=True).sum())
+        if isinstance(value, (bytes, bytearray)):
+            return len(value)
+        if hasattr(value, 'nbytes'):  # objects that know their own size, e.g., FeederData
+            return int(value.nbytes)
+        return sys.getsizeof(value)
+
+    def get(self, key):
+        """
+        retrieve a value from the cache
+        :param key: hashable key, usually a tuple of url and date
+        :return: cached value or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() >= entry[1]:  # expired entries stay for revalidation
+                return None
+            self._entries.move_to_end(key)  # mark as most recently used
+            return entry[0]
+
+    def get_stale(self, key) -> tuple:
+        """
+        retrieve a value and its http validators even if the entry has expired
+        :param key: hashable key, usually a tuple of url and date
+        :return: tuple of cached value and validators dict, (None, {}) if missing
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, {}
+            return entry[0], entry[3]
+
+    def refresh(self, key, ttl: float) -> bool:
+        """
+        extend the life of an existing entry, used when the server confirms the cached value is still current
+        :param key: hashable key, usually a tuple of url and date
+        :param ttl: seconds the value remains valid
+        :return: True if the entry was found
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            self._entries[key] = (entry[0], time.monotonic() + ttl, entry[2], entry[3])
+            self._entries.move_to_end(key)
+        return True
+
+    def put(self, key, value, ttl: float, validators: dict = None):
+        """
+        add or replace a value in the cache and evict least recently used entries to stay under max_bytes
+        :param key: hashable key, usually a tuple of url and date
+        :param value: value to cache
+        :param ttl: seconds the value remains valid
+        :param validators: http response headers used to revalidate the value, ETag and Last-Modified, along with
+            the byte offset and csv columns read so far for incremental reads
+        :return: the value passed in
+        """
+        nbytes = self.size_of(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if nbytes > self.max_bytes:  # never cache something that would flush everything else
+                return value
+            self._entries[key] = (value, time.monotonic() + ttl, nbytes, validators or {})
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))  # oldest entry is first
+        return value
+
+    def expire(self, key) -> None:
+        """
+        mark an entry as expired so the next read revalidates it, the value and validators are kept
+        :param key: hashable key, usually a tuple of url and date
+        :return: None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], 0, entry[2], entry[3])
+        return
+
+    def discard(self, key) -> None:
+        """
+        remove an entry and its validators, e.g., the source was deleted
+        :param key: hashable key, usually a tuple of url and date
+        :return: None
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+        return
+
+    def clear(self) -> None:
+        """
+        empty the cache
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+        return
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key) -> None:
+        """
+        remove an entry, caller must hold the lock
+        :param key: key to remove
+        :return: None
+        """
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry[2]
+        return
+
+
+class SnapshotStore:
+    """
+    local store of parsed and typed dfs saved as uncompressed feather files so later process starts can memory
+    map them instead of downloading and parsing csvs.  each snapshot has a json sidecar with the signature of the
+    source it was built from, http validators for a url or modified time and size for a local file, and the
+    snapshot version.  callers compare the signature to decide if the snapshot is still current.  snapshots for
+    a day are named starting with the date and are removed once they are older than max_days
+    """
+    def __init__(self, directory: str = SNAPSHOT_DIR, version: int = SNAPSHOT_VERSION,
+                 max_days: int = MAX_HISTORY_DAYS) -> None:
+        """
+        :param directory: folder to hold the snapshot files, created on first save
+        :param version: layout version, snapshots saved with another version are ignored
+        :param max_days: days of day snapshots to keep, older ones are pruned on save
+        :return: None
+        """
+        self.directory = directory
+        self.version = version
+        self.max_days = max_days
+        self.enabled = PYARROW_AVAILABLE  # feather needs pyarrow
+        return
+
+    def _paths(self, name: str) -> tuple:
+        """
+        :param name: snapshot name
+        :return: tuple of the data file and sidecar file paths
+        """
+        path = os.path.join(self.directory, name)
+        return path + '.feather', path + '.json'
+
+    def load(self, name: str) -> tuple:
+        """
+        load a snapshot memory mapped
+        :param name: snapshot name
+        :return: tuple of df and the source signature saved with it, (None, {}) if missing, stale, or unreadable
+        """
+        if not self.enabled:
+            return None, {}
+        data_path, meta_path = self._paths(name)
+        try:
+            with open(meta_path, 'r') as meta_file:
+                meta = json.load(meta_file)
+            if meta.get('version') != self.version:
+                return None, {}
+            table = feather.read_table(data_path, memory_map=True)
+            df = table.to_pandas(split_blocks=True, self_destruct=True,  # avoid consolidating into new blocks
+                                 ignore_metadata=True,  # the index is restored from the sidecar below
+                                 types_mapper={pa.string(): pd.StringDtype('pyarrow'),  # keep arrow strings
+                                               pa.large_string(): pd.StringDtype('pyarrow')}.get)
+            if meta['index']:
+                df = df.set_index(meta['index'])
+            return df, meta['signature']
+        except FileNotFoundError:  # not saved yet
+            return None, {}
+        except (OSError, ValueError, KeyError) as e:
+            print(f'snapshot {name} not loaded: {e}')
+            return None, {}
+
+    def save(self, name: str, df: pandas.DataFrame, signature: dict) -> None:
+        """
+        save a df and the signature of its source, files are written to temp names and renamed into place so
+        readers in other threads never see a partial snapshot
+        :param name: snapshot name
+        :param df: df to save
+        :param signature: json serializable signature of the source the df was built from
+        :return: None
+        """
+        if not self.enabled:
+            return
+        data_path, meta_path = self._paths(name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            index_names = [index_name for index_name in df.index.names if index_name is not None]
+            df_save = df.reset_index(drop=len(index_names) == 0)
+            suffix = f'.{os.getpid()}.{threading.get_ident()}.tmp'
+            feather.write_feather(df_save, data_path + suffix, compression='uncompressed')
+            with open(meta_path + suffix, 'w') as meta_file:
+                json.dump({'version': self.version, 'signature': signature, 'index': index_names}, meta_file)
+            os.replace(data_path + suffix, data_path)
+            os.replace(meta_path + suffix, meta_path)
+        except (OSError, ValueError, TypeError) as e:  # snapshots are an optimization, never fail the page
+            print(f'snapshot {name} not saved: {e}')
+        self.prune()
+        return
+
+    def remove(self, name: str) -> None:
+        """
+        remove a snapshot, e.g., its source was deleted
+        :param name: snapshot name
+        :return: None
+        """
+        for path in self._paths(name):
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # never saved or already removed
+                pass
+            except OSError as e:
+                print(f'snapshot {name} not removed: {e}')
+        return
+
+    def prune(self) -> int:
+        """
+        remove day snapshots older than max_days so the store does not grow forever, on cloud run the temp
+        folder is held in memory.  snapshots without a date at the start of the name are kept
+        :return: number of files removed
+        """
+        oldest = (dtdate.today() - timedelta(days=self.max_days)).strftime('%Y-%m-%d')
+        removed = 0
+        try:
+            file_names = os.listdir(self.directory)
+        except OSError:  # nothing saved yet
+            return removed
+        for file_name in file_names:
+            try:
+                datetime.strptime(file_name[:10], '%Y-%m-%d')
+            except ValueError:  # not a day snapshot
+                continue
+            if file_name[:10] < oldest:
+                try:
+                    os.remove(os.path.join(self.directory, file_name))
+                    removed += 1
+                except OSError as e:  # removed by another thread or process
+                    print(f'snapshot {file_name} not removed: {e}')
+        return removed
+
+
+class StageTimings:
+    """
+    thread safe wall time and counters for each stage of loading and rendering, e.g., bytes fetched, rows parsed,
+    and cache hits.  the last TIMING_WINDOW wall times of each stage are kept for percentiles while the counters
+    are totals since the process started or the last reset
+    """
+    def __init__(self, window: int = TIMING_WINDOW, log: bool = TIMING_LOG) -> None:
+        """
+        :param window: number of recent wall times kept per stage
+        :param log: True to print a json line for every timed call
+        :return: None
+        """
+        self.window = window
+        self.log = log
+        self._seconds = {}  # stage: deque of recent wall times
+        self._counters = {}  # stage: dict of counter totals
+        self._lock = threading.Lock()
+        return
+
+    def record(self, stage: str, seconds: float = None, **counters) -> None:
+        """
+        add a call to a stage and or add to its counters
+        :param stage: stage name, e.g., load_message_stream
+        :param seconds: wall time of the call, None to only add counters
+        :param counters: counter name and amount, e.g., bytes=1024
+        :return: None
+        """
+        with self._lock:
+            totals = self._counters.setdefault(stage, {})
+            if seconds is not None:
+                self._seconds.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+                totals['calls'] = totals.get('calls', 0) + 1
+            for name, amount in counters.items():
+                totals[name] = totals.get(name, 0) + amount
+        if self.log:
+            line = {'stage': stage, 'thread': threading.current_thread().name, **counters}
+            if seconds is not None:
+                line['ms'] = round(seconds * 1000, 3)
+            sys.stdout.write(json.dumps(line) + '\n')  # one write so lines from threads do not interleave
+        return
+
+    @contextmanager
+    def timed(self, stage: str):
+        """
+        time the body of a with block, counters added to the yielded dict are recorded with the wall time
+        :param stage: stage name
+        :return: dict of counters for the call
+        """
+        counters = {}
+        start = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            self.record(stage, time.perf_counter() - start, **counters)
+
+    def summary(self) -> pandas.DataFrame:
+        """
+        percentiles of the recent wall times and the counter totals for every stage
+        :return: df with a row per stage
+        """
+        with self._lock:
+            seconds = {stage: np.array(values) for stage, values in self._seconds.items()}
+            counters = {stage: dict(totals) for stage, totals in self._counters.items()}
+        rows = []
+        for stage, totals in counters.items():
+            row = {'stage': stage}
+            if stage in seconds:
+                p50, p90, p99 = np.percentile(seconds[stage], [50, 90, 99]) * 1000
+                row.update({'p50 ms': p50, 'p90 ms': p90, 'p99 ms': p99, 'max ms': seconds[stage].max() * 1000})
+            row.update(totals)
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def reset(self) -> None:
+        """
+        drop all wall times and counters
+        :return: None
+        """
+        with self._lock:
+            self._seconds.clear()
+            self._counters.clear()
+        return
+
+
+TIMINGS = StageTimings()  # one per process, every session adds to it
+
+
+def timed_stage(stage: str):
+    """
+    decorator that records the wall time of a function in TIMINGS, the rows when it returns a df, and an error
+    count when it raises
+    :param stage: stage name
+    :return: decorator
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            counters = {'errors': 1}  # replaced when the call returns
+            try:
+                result = function(*args, **kwargs)
+                is_df = 'pandas' in sys.modules and isinstance(result, pd.DataFrame)  # never import pandas here
+                counters = {'rows': len(result)} if is_df else {}
+                return result
+            finally:
+                TIMINGS.record(stage, time.perf_counter() - start, **counters)
+        return wrapper
+    return decorator
+
+
+# one cache per process, module level so every session and page shares it
+DATA_CACHE = DataCache()
+THUMBNAIL_CACHE = DataCache(max_bytes=THUMBNAIL_CACHE_MAX_BYTES)
+SNAPSHOTS = SnapshotStore()
+# one bounded pool per process for downloads so concurrent sessions can not flood the bucket with requests
+FETCH_POOL = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='fetch')
+THUMBNAIL_POOL = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnail')
+
+
+def fetch_response(url: str, headers: dict = None, timeout: float = FETCH_TIMEOUT,
+                   retries: int = FETCH_RETRIES) -> tuple:
+    """
+    send a get request, retrying transient errors, e.g., a timeout or a 503, with a backoff.  a 304 not modified
+    answer to a conditional request and a 416 answer to a range request past the end of the file are returned like
+    a success, other errors such as a 404 for a day that has no file yet are raised
+    :param url: url to download
+    :param headers: optional request headers, e.g., If-None-Match
+    :param timeout: seconds to wait on the request
+    :param retries: number of retries after the first attempt
+    :return: tuple of status code, response headers, and response body
+    """
+    backoff = FETCH_BACKOFF
+    request = urllib.request.Request(url, headers=headers or {})
+    for attempt in range(retries + 1):
+        try:
+            with TIMINGS.timed('fetch') as counters, urllib.request.urlopen(request, timeout=timeout) as response:
+                body = response.read()
+                counters['bytes'] = len(body)
+                return response.status, response.headers, body
+        except HTTPError as e:
+            if e.code in (304, 416):  # not modified, or a range request with no new bytes
+                TIMINGS.record('fetch', not_modified=1)
+                return e.code, e.headers, b''
+            if e.code not in FETCH_RETRY_STATUS or attempt == retries:  # e.g., 404, retrying will not change it
+                raise
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            if attempt == retries:
+                raise urllib.error.URLError(f'{url} failed after {retries + 1} attempts: {e}')
+        time.sleep(backoff)  # transient error, wait and try again
+        backoff *= 2
+
+
+def fetch_url(url: str, timeout: float = FETCH_TIMEOUT, retries: int = FETCH_RETRIES) -> bytes:
+    """
+    download the body of a url, see fetch_response
+    :param url: url to download
+    :param timeout: seconds to wait on the request
+    :param retries: number of retries after the first attempt
+    :return: response body
+    """
+    return fetch_response(url, timeout=timeout, retries=retries)[2]
+
+
+@timed_stage('head')
+def url_exists(url: str, timeout: float = FETCH_TIMEOUT) -> bool:
+    """
+    check that a url exists with a head request so the body is never downloaded
+    :param url: url to check
+    :param timeout: seconds to wait on the request
+    :return: True if the server has the object
+    """
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method='HEAD'), timeout=timeout):
+            return True
+    except HTTPError:  # 404 or 403 for a missing object
+        return False
+    except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+        print(f'unable to check {url}: {e}')
+        return False
+
+
+@timed_stage('make_thumbnail')
+def make_thumbnail(image_bytes: bytes, size: tuple = THUMBNAIL_SIZE, fmt: str = THUMBNAIL_FORMAT,
+                   first_frame: bool = True) -> bytes:
+    """
+    downscale an image to fit within size
+    :param image_bytes: jpg or gif image
+    :param size: tuple of max width and height
+    :param fmt: output format for still thumbnails, JPEG or WEBP
+    :param first_frame: True to use only the first frame of an animated gif, False to keep the animation
+    :return: encoded thumbnail
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    thumbnail_io = io.BytesIO()
+    if not first_frame and getattr(img, 'is_animated', False):  # shrink every frame and keep the timing
+        frames = []
+        for frame in ImageSequence.Iterator(img):
+            frame = frame.convert('RGB')
+            frame.thumbnail(size)
+            frames.append(frame)
+        frames[0].save(thumbnail_io, format='GIF', save_all=True, append_images=frames[1:],
+                       duration=img.info.get('duration', 100), loop=img.info.get('loop', 0))
+    else:
+        img.seek(0)
+        img = img.convert('RGB')
+        img.thumbnail(size)
+        img.save(thumbnail_io, format=fmt, quality=THUMBNAIL_QUALITY)
+    return thumbnail_io.getvalue()
+
+
+def get_thumbnail(url: str, size: tuple = THUMBNAIL_SIZE, fmt: str = THUMBNAIL_FORMAT,
+                  first_frame: bool = True) -> bytes:
+    """
+    thumbnail for an image url, images are downloaded and downscaled once and kept in a bounded lru cache
+    :param url: url of the full size image
+    :param size: tuple of max width and height
+    :param fmt: output format for still thumbnails, JPEG or WEBP
+    :param first_frame: True to use only the first frame of an animated gif, False to keep the animation
+    :return: encoded thumbnail, raises HTTPError if the image is missing
+    """
+    key = (url, tuple(size), fmt, first_frame)
+    thumbnail = THUMBNAIL_CACHE.get(key)
+    if thumbnail is None:
+        thumbnail = make_thumbnail(fetch_url(url), size, fmt, first_frame)
+        THUMBNAIL_CACHE.put(key, thumbnail, CACHE_TTL_IMAGE_FOUND)
+    return thumbnail
+
+
+def conditional_headers(validators: dict) -> dict:
+    """
+    build the request headers for a conditional get from the validators saved with a cached response
+    :param validators: dict with ETag and Last-Modified values from a prior response
+    :return: dict of request headers, empty if there is nothing to revalidate with
+    """
+    headers = {}
+    if validators.get('ETag'):
+        headers['If-None-Match'] = validators['ETag']
+    if validators.get('Last-Modified'):
+        headers['If-Modified-Since'] = validators['Last-Modified']
+    return headers
+
+
+class SpeciesNameTable:
+    """
+    process wide memo of raw species labels, e.g., 'Cardinalis cardinalis (Northern Cardinal)', to common names
+    along with the color maps for each list of species so every chart uses the same color for a species.
+    both memos are bounded, least recently used entries are dropped so free text labels and changing species
+    lists do not grow them forever
+    """
+    def __init__(self, max_names: int = SPECIES_NAMES_MAX, max_color_maps: int = SPECIES_COLOR_MAPS_MAX) -> None:
+        self.names = OrderedDict()  # raw label: common name, least to most recently used
+        self.max_names = max_names
+        self.color_maps = OrderedDict()  # tuple of common names: (histogram color map, line color map)
+        self.max_color_maps = max_color_maps
+        self._lock = threading.Lock()
+        return
+
+    @staticmethod
+    def parse(labels: pandas.Series) -> pandas.Series:
+        """
+        parse the common name from raw labels, drop the text before the first space and then take the text
+        inside the parentheses if there are any
+        :param labels: series of raw labels
+        :return: series of common names
+        """
+        names = labels.str.split(' ', n=1).str[-1]
+        in_parens = names.str.extract(r'\(([^)]*)', expand=False)
+        return in_parens.fillna(names)
+
+    def common_names(self, labels: pandas.Series) -> pandas.Series:
+        """
+        look up the common name for each raw label, parsing only labels that are not in the memo
+        :param labels: series of raw labels
+        :return: series of common names aligned with labels
+        """
+        names = {}  # snapshot of the memo for these labels, mapped without holding the lock
+        new_labels = []
+        with self._lock:
+            for label in pd.unique(labels):
+                if label in self.names:
+                    self.names.move_to_end(label)
+                    names[label] = self.names[label]
+                else:
+                    new_labels.append(label)
+        if len(new_labels) > 0:
+            new_names = dict(zip(new_labels, self.parse(pd.Series(new_labels, dtype=object))))
+            names.update(new_names)
+            with self._lock:
+                self.names.update(new_names)
+                while len(self.names) > self.max_names:
+                    self.names.popitem(last=False)
+        return labels.map(names)
+
+    def color_maps_for(self, common_names: list) -> tuple:
+        """
+        color maps for a sorted list of species, built once for each distinct list
+        :param common_names: sorted list of common names
+        :return: tuple of dicts, colors for histograms and colors for line charts
+        """
+        key = tuple(common_names)
+        with self._lock:
+            color_maps = self.color_maps.get(key)
+            if color_maps is not None:
+                self.color_maps.move_to_end(key)
+                return color_maps
+        color_maps = (dict(zip(common_names, colors.sequential.Viridis)),
+                      dict(zip(common_names, bird_colors(range(len(common_names))))))
+        with self._lock:
+            self.color_maps[key] = color_maps
+            while len(self.color_maps) > self.max_color_maps:
+                self.color_maps.popitem(last=False)
+        return color_maps
+
+
+# one name table per process shared by every session and page
+SPECIES_NAMES = SpeciesNameTable()
+
+
+class FrameIndex:
+    """
+    precomputed row groups for a loaded df keyed by (date, feeder name) so filters are index lookups and
+    bitmasks over categorical codes instead of string scans of the whole df.  the index is tied to the df it was
+    built for, rebuild it when the df is replaced
+    """
+    def __init__(self, df: pandas.DataFrame, date_key: pandas.Series) -> None:
+        """
+        :param df: df to index, low cardinality columns should be categorical
+        :param date_key: series of dates at midnight aligned with df used as the date part of the group key
+        :return: None
+        """
+        self.df = df
+        date_key = pd.Series(date_key.to_numpy(), name='Date')  # positional, df index may have duplicates
+        feeder_key = pd.Series(df['Feeder Name'].to_numpy(), name='Feeder Name')
+        self.groups = {key: positions for key, positions in  # (date, feeder): array of row positions
+                       pd.DataFrame({'Date': date_key, 'Feeder Name': feeder_key})
+                       .groupby(['Date', 'Feeder Name'], observed=True, sort=False).indices.items()}
+        return
+
+    def positions(self, date_options: list, feeder_options: list) -> np.ndarray:
+        """
+        find the rows for the selected dates and feeders
+        :param date_options: list of date strings in the format yyyy-mm-dd
+        :param feeder_options: list of feeder names
+        :return: sorted array of row positions, sorted keeps the order of the df
+        """
+        dates = pd.to_datetime(date_options)
+        groups = [self.groups.get((date, feeder)) for date in dates for feeder in feeder_options]
+        groups = [group for group in groups if group is not None]
+        return np.sort(np.concatenate(groups)) if len(groups) > 0 else np.array([], dtype=np.intp)
+
+    def mask(self, positions: np.ndarray, col: str, values: list) -> np.ndarray:
+        """
+        bitmask of rows at the positions whose categorical column value is in a list
+        :param positions: row positions to test
+        :param col: name of a categorical column
+        :param values: list of values to match
+        :return: boolean array aligned with positions
+        """
+        codes = self.df[col].cat.codes.to_numpy()[positions]
+        wanted = self.df[col].cat.categories.get_indexer(values)
+        return np.isin(codes, wanted[wanted >= 0])
+
+    def select(self, positions: np.ndarray) -> pandas.DataFrame:
+        """
+        rows of the df at the positions
+        :param positions: row positions to return
+        :return: filtered df
+        """
+        return self.df.iloc[positions]
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    largest triangle three buckets downsampling, keeps the points that preserve the shape of a line.  runs for
+    every column of y at once so all species are downsampled in one pass over the buckets
+    :param x: 1d array of x values, e.g., dates as int64
+    :param y: 2d array with a column of y values for each series
+    :param threshold: number of points to keep, first and last points are always kept
+    :return: 2d array of row positions to keep with a column for each series
+    """
+    n, num_series = y.shape
+    if threshold >= n or threshold < 3:
+        return np.repeat(np.arange(n)[:, None], num_series, axis=1)
+    x = x.astype(float)
+    cols = np.arange(num_series)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)  # threshold - 2 buckets between first and last point
+    keep = np.zeros((threshold, num_series), dtype=np.intp)
+    keep[-1] = n - 1
+    prior = np.zeros(num_series, dtype=np.intp)  # selected point in the prior bucket
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()  # average of the next bucket is the third point of the triangle
+        next_y = y[end:next_end].mean(axis=0)
+        prior_x, prior_y = x[prior], y[prior, cols]
+        area = np.abs((prior_x - next_x) * (y[start:end] - prior_y) -
+                      (prior_x - x[start:end, None]) * (next_y - prior_y))
+        prior = start + area.argmax(axis=0)
+        keep[bucket + 1] = prior
+    return keep
+
+
+def stratified_sample(df: pandas.DataFrame, num_samples: int, seed: int = SAMPLE_SEED, species_col: str = 'Species',
+                      strata_cols: list = SAMPLE_STRATA, min_count: int = SAMPLE_MIN_SPECIES_COUNT) -> pandas.Index:
+    """
+    seeded sample of up to num_samples rows for every species with more than min_count rows, spread across the
+    strata in proportion to their rows, e.g., a species seen mostly in the morning is sampled mostly in the morning
+    but every hour it was seen gets its share.  all species are sampled in one pass: rows are ranked in random
+    order within their species and stratum, the rank is scaled by the stratum size, and the lowest scaled ranks of
+    each species are kept
+    :param df: rows to sample from with species and strata columns
+    :param num_samples: max rows per species, species with fewer rows are sampled completely
+    :param seed: random seed, the same df and seed always give the same sample
+    :param species_col: column with the species name
+    :param strata_cols: columns to stratify by within each species
+    :param min_count: species with this many rows or fewer are skipped
+    :return: index labels of the sampled rows ordered by species
+    """
+    species_counts = df[species_col].value_counts()
+    df = df[df[species_col].isin(species_counts.index[species_counts > min_count])]
+    rng = np.random.default_rng(seed)
+    order = pd.Series(rng.random(len(df)))
+    species_key = pd.Series(df[species_col].to_numpy())
+    group_keys = [species_key] + [pd.Series(df[col].to_numpy()) for col in strata_cols]
+    strata = order.groupby(group_keys, observed=True, sort=False)
+    scaled_rank = (strata.rank(method='first') - 1 + rng.random(len(df))) / strata.transform('size')
+    species_rank = scaled_rank.groupby(species_key, observed=True, sort=False).rank(method='first')
+    keep = (species_rank <= num_samples).to_numpy()
+    return df.index[keep][np.argsort(species_key[keep].to_numpy(), kind='stable')]
+
+
+class TrendsEngine:
+    """
+    daily counts by species with the weekly and monthly rollups and rolling averages precomputed once, the
+    trends chart picks a resolution for the selected range and downsamples long ranges so the number of points
+    stays flat as the history grows
+    """
+    def __init__(self, df: pandas.DataFrame, min_count: int = 1) -> None:
+        """
+        :param df: daily history with year-day, common name, and counts columns, treat it as read only
+        :param min_count: daily counts at or below this are dropped, e.g., a single misidentification
+        :return: None
+        """
+        self.history = df
+        df = df[df['counts'] > min_count]
+        daily = df.pivot_table(index='Year-Day', columns='Common Name', values='counts', aggfunc='sum',
+                               fill_value=0, observed=True)
+        daily = daily.asfreq('D', fill_value=0)  # one row per day, days without visits count as zero
+        self.species = list(daily.columns)
+        self.tables = {'Daily': daily}  # resolution: wide df of dates by species
+        for name, rule in TREND_ROLLUPS.items():  # label each bin by its first day so a range slice keeps it
+            self.tables[name] = daily.resample(rule, label='left', closed='left').sum()
+        for name, window in TREND_AVERAGES.items():
+            self.tables[name] = daily.rolling(window, min_periods=1).mean()
+        return
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: memory used by the precomputed tables, the history df is cached and counted on its own
+        """
+        return sum(int(table.memory_usage(index=True, deep=True).sum()) for table in self.tables.values())
+
+    @property
+    def first_date(self):
+        return self.tables['Daily'].index.min()
+
+    @property
+    def last_date(self):
+        return self.tables['Daily'].index.max()
+
+    @staticmethod
+    def auto_resolution(start, end, max_points: int = TREND_MAX_POINTS) -> str:
+        """
+        pick the finest rollup that keeps a range under the max number of points
+        :param start: first date of the range
+        :param end: last date of the range
+        :param max_points: points per species
+        :return: resolution name
+        """
+        days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+        if days <= max_points:
+            return 'Daily'
+        return 'Weekly' if days / 7 <= max_points else 'Monthly'
+
+    @timed_stage('trends_series')
+    def series(self, resolution: str = 'Auto', start=None, end=None,
+               max_points: int = TREND_MAX_POINTS) -> pandas.DataFrame:
+        """
+        counts by species for a range at a resolution, downsampled with lttb when there are more than max points
+        :param resolution: Auto, Daily, a TREND_ROLLUPS name, or a TREND_AVERAGES name
+        :param start: first date, defaults to the first day of history
+        :param end: last date, defaults to the last day of history
+        :param max_points: points per species
+        :return: long df with year-day, common name, and counts columns for px.line
+        """
+        start = pd.Timestamp(start) if start is not None else self.first_date
+        end = pd.Timestamp(end) if end is not None else self.last_date
+        if resolution == 'Auto':
+            resolution = self.auto_resolution(start, end, max_points)
+        table = self.tables[resolution]
+        if resolution in TREND_ROLLUPS and len(table) > 0:  # start from the bin holding start, it may begin before
+            start = min(start, table.index[max(table.index.searchsorted(start, side='right') - 1, 0)])
+        table = table.loc[start:end]
+        if len(table) > max_points:  # keep the shape of each line with a fixed number of points
+            keep = lttb_indices(table.index.asi8, table.to_numpy(dtype=float), max_points)
+            df = pd.DataFrame({'Year-Day': table.index.to_numpy()[keep].ravel(order='F'),
+                               'Common Name': np.repeat(table.columns.to_numpy(), keep.shape[0]),
+                               'counts': table.to_numpy()[keep, np.arange(keep.shape[1])].ravel(order='F')})
+        else:
+            df = table.melt(ignore_index=False, value_name='counts').reset_index()
+            df = df.rename(columns={df.columns[0]: 'Year-Day'})
+        return df
+
+
+class FeederData:
+    """
+    one load of the feeder data, occurrences, message stream, and the values derived from them, shared by every
+    session and page in the process through DATA_CACHE so switching pages does not reload anything.  the frames
+    and lists are shared, treat them as read only
+    """
+    def __init__(self, webpage: 'WebPages') -> None:
+        """
+        capture the data from a page that has just loaded it
+        :param webpage: WebPages object after load_feeder_data
+        :return: None
+        """
+        self.df_occurrences = webpage.df_occurrences
+        self.df_msg_stream = webpage.df_msg_stream
+        self.occurrences_index = FrameIndex(self.df_occurrences, self.df_occurrences['Date'])
+        self.msg_stream_index = FrameIndex(self.df_msg_stream, self.df_msg_stream['Date Time'].dt.normalize())
+        self.dates = list(webpage.dates)
+        self.birds = webpage.birds
+        self.feeders = list(webpage.feeders)
+        self.common_names = list(webpage.common_names)
+        self.bird_color_map_hist = webpage.bird_color_map_hist
+        self.bird_color_map = webpage.bird_color_map
+        self.loaded_at = datetime.now(webpage.Tz)
+        # the cached day frames this was built from, weak so the cache can still evict them
+        self.day_frames = {key: None if df is None else weakref.ref(df) for key, df in webpage.day_frames.items()}
+        return
+
+    def same_frames(self, day_frames: dict) -> bool:
+        """
+        check if this was built from the same day frames, the cache returns the same df object for a day until
+        the file changes so an unchanged day is the same object
+        :param day_frames: dict keyed by (file name, date) from fetch_day_files
+        :return: True if every day frame is the one this was built from
+        """
+        if day_frames.keys() != self.day_frames.keys():
+            return False
+        for key, df in day_frames.items():
+            ref = self.day_frames[key]
+            if (None if ref is None else ref()) is not df:  # changed, missing, or evicted from the cache
+                return False
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: memory used by the shared frames
+        """
+        return DataCache.size_of(self.df_occurrences) + DataCache.size_of(self.df_msg_stream)
+
+    def apply(self, webpage: 'WebPages') -> None:
+        """
+        set the shared data on a page, lists the page may change are copied
+        :param webpage: WebPages object rendering a page
+        :return: None
+        """
+        webpage.df_occurrences = self.df_occurrences
+        webpage.df_msg_stream = self.df_msg_stream
+        webpage.occurrences_index = self.occurrences_index
+        webpage.msg_stream_index = self.msg_stream_index
+        webpage.dates = list(self.dates)
+        webpage.available_dates = webpage.dates
+        webpage.birds = self.birds
+        webpage.feeders = list(self.feeders)
+        webpage.common_names = self.common_names
+        webpage.bird_color_map_hist = self.bird_color_map_hist
+        webpage.bird_color_map = self.bird_color_map
+        return
+
+
+class FeederDataRefresher(threading.Thread):
+    """
+    background thread that reloads today's feeder data on a fixed interval and swaps the new FeederData into
+    DATA_CACHE, requests keep reading the prior snapshot until the swap so they never wait on the bucket.
+    only the default HISTORY_DAYS window is reloaded, other windows expire after FEEDER_DATA_MAX_AGE and their
+    next request rebuilds them from today's files that this thread keeps revalidated.
+    start with start_background_refresh, one thread per url prefix in the process
+    """
+    def __init__(self, url_prefix: str, interval: float = REFRESH_INTERVAL) -> None:
+        """
+        :param url_prefix: url prefix to retrieve contents from Google storage
+        :param interval: seconds between reloads
+        :return: None
+        """
+        super().__init__(name='feeder-refresh', daemon=True)  # never keep the process alive
+        self.url_prefix = url_prefix
+        self.interval = interval
+        self.refresh_count = 0
+        self._stop_event = threading.Event()
+        return
+
+    def run(self) -> None:
+        """
+        reload until stopped, errors are logged and the next interval tries again
+        :return: None
+        """
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:  # keep serving the last good data
+                print(f'background refresh failed: {e}')
+        return
+
+    def refresh(self) -> None:
+        """
+        revalidate today's files and build a new shared FeederData off the request path, the rebuild is skipped
+        when no file changed.  the dates are rebuilt each time so the window rolls over at midnight
+        :return: None
+        """
+        webpage = WebPages(url_prefix=self.url_prefix)
+        webpage.expire_today()
+        webpage.shared_data(refresh=True)
+        webpage.shared_history()  # reloads only when the hourly ttl has passed
+        self.refresh_count += 1
+        return
+
+    def stop(self) -> None:
+        """
+        stop the thread after the current reload
+        :return: None
+        """
+        self._stop_event.set()
+        return
+
+
+REFRESHERS = {}  # url prefix: running FeederDataRefresher
+REFRESHERS_LOCK = threading.Lock()
+
+
+def start_background_refresh(url_prefix: str, interval: float = REFRESH_INTERVAL):
+    """
+    start the background refresh for a url prefix if it is not already running
+    :param url_prefix: url prefix to retrieve contents from Google storage
+    :param interval: seconds between reloads, 0 or less does not start a refresh
+    :return: the running FeederDataRefresher or None
+    """
+    if interval <= 0:
+        return None
+    with REFRESHERS_LOCK:
+        refresher = REFRESHERS.get(url_prefix)
+        if refresher is None or not refresher.is_alive():
+            refresher = FeederDataRefresher(url_prefix, interval)
+            refresher.start()
+            REFRESHERS[url_prefix] = refresher
+    return refresher
+
 
 class WebPages:
     def __init__(self, min_hr: int = 6, max_hr: int = 18, num_image_cols: int = 5,
-                 url_prefix: str = 'https://storage.googleapis.com/tweeterssp-web-site-contents/') -> None:
+                 url_prefix: str = 'https://storage.googleapis.com/tweeterssp-web-site-contents/',
+                 gallery_page_size: int = 25, num_days: int = HISTORY_DAYS, start_date: str = None,
+                 end_date: str = None) -> None:
         """
         set up class to handle the creation of all the web pages along with the data
         :param min_hr: minimum hour value to display on chart
         :param max_hr: max hour value to display on chart.  0 to 24
         :param num_image_cols: number of cols to display in a row on the web page
         :param url_prefix: url prefix to retrieve contents from Google storage
+        :param gallery_page_size: default number of images on each page of an image gallery
+        :param num_days: number of days of data ending today, ignored when start_date is set
+        :param start_date: optional first date of an explicit range in the format yyyy-mm-dd
+        :param end_date: optional last date of an explicit range, defaults to today
         :return: None
         """
         # set default values
@@ -69,48 +1127,324 @@ class WebPages:
         self.url_prefix = url_prefix
         self.url_prefix_archive = 'https://storage.googleapis.com/archive_jpg_from_birdclassifier/'
         self.num_image_cols = num_image_cols
-        # load date range for web data, currently 3 days of data retained
-        self.dates = []
+        self.gallery_page_size = gallery_page_size
         self.Tz = pytz.timezone("America/Chicago")  # localize time to current madison wi cst bird feeder
-        # grab today's date along with the two prior for the drop-down date list selector
-        self.dates.append(datetime.now(self.Tz).strftime('%Y-%m-%d'))
-        self.dates.append((datetime.now(self.Tz) - timedelta(days=1)).strftime('%Y-%m-%d'))
-        self.dates.append((datetime.now(self.Tz) - timedelta(days=2)).strftime('%Y-%m-%d'))
+        # date range for web data and the drop-down date list selector, most recent first
+        self.dates = self.date_window(num_days, start_date, end_date)
         # init vars
-        self.df_occurrences = pd.DataFrame()
-        self.df_msg_stream = pd.DataFrame()
+        self.df_occurrences = None  # set by load_feeder_data or shared data
+        self.df_msg_stream = None
+        self.occurrences_index = None  # FrameIndex for df_occurrences, built on first filter
+        self.msg_stream_index = None  # FrameIndex for df_msg_stream, built on first filter
+        self.day_frames = {}  # (file name, date): df for each day, set by load_feeder_data
         self.birds = []
         self.bird_dd_options = []
         self.image_names = []
         self.feeders = []
         self.available_dates = self.dates
-        self.color_list = [
-            "#F0F8FF", "#FAEBD7", "#00FFFF", "#7FFFD4", "#F0FFFF",
-            "#F5F5DC", "#FFCEF4", "#FFB6C1", "#FFDAB9", "#CD853F",
-            "#F0E68C", "#FFFFE0", "#008B8B", "#9ACD32", "#00BFFF",
-            "#87CEFA", "#7FFFD4", "#66CDAA", "#00CED1", "#90EE90",
-            "#D3D3D3", "#9AC6CD", "#8B8B8B", "#808080", "#9400D3",
-            "#FF1493", "#B22222", "#228B22", "#DAA520", "#800000",
-            "#00008B", "#0000CD", "#0000FF", "#4B0082", "#8B0000",
-            "#808000", "#FFFF00", "#00FF00", "#808080", "#000000",
-            "#8B4513", "#A0522D", "#C0C0C0", "#808080", "#800080",
-            "#FFA500", "#FF4500", "#DA70D6", "#EEE8AA", "#98FB98",
-            "#AFEEEE", "#ADD8E6", "#DDA0DD", "#D8BFD8", "#FF00FF",
-            "#DC143C", "#00FFFF", "#0000FF", "#8A2BE2", "#A52A2A",
-            "#DEB887", "#5F9EA0", "#7FFF00", "#D2691E", "#CD853F",
-            "#FFD700", "#DAA520", "#808000", "#008000", "#800080",
-            "#FF00FF", "#BC8F8F", "#483D8B", "#2F4F4F", "#00CED1",
-            "#9400D3", "#FF1493", "#00BFFF", "#66CDAA", "#008B8B",
-            "#B0C4DE", "#FFFFE0", "#00FF00", "#FF0000", "#8B008B",
-            "#808080", "#9ACD32", "#6B8E23", "#FFA07A", "#20B2AA",
-            "#87CEEB", "#6A5ACD", "#708090", "#778899", "#B0C4DE",
-            "#FFFFE0", "#00FF00", "#FF0000", "#8B008B", "#808080"]
-        self.cmap = mcolors.ListedColormap(self.color_list)
+        self.color_list = BIRD_COLORS
+        self.cmap = bird_colors
         self.bird_color_map = {}
         self.bird_color_map_hist = {}
         self.common_names = []
         return
 
+    def date_window(self, num_days: int = HISTORY_DAYS, start_date: str = None, end_date: str = None) -> list:
+        """
+        build the list of dates to load, either the last num_days ending today or an explicit range
+        :param num_days: number of days ending today, ignored when start_date is set
+        :param start_date: optional first date of the range in the format yyyy-mm-dd
+        :param end_date: optional last date of the range, defaults to today
+        :return: list of date strings in the format yyyy-mm-dd, most recent first
+        """
+        today = datetime.now(self.Tz).date()
+        last = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date is not None else today
+        if start_date is not None:
+            num_days = (last - datetime.strptime(start_date, '%Y-%m-%d').date()).days + 1
+        return [(last - timedelta(days=day)).strftime('%Y-%m-%d') for day in range(max(num_days, 1))]
+
+    def select_date_window(self) -> None:
+        """
+        sidebar control for the number of days of data to load, days already fetched by any session come from
+        the cache so a longer window only downloads the days that are new to it
+        :return: None
+        """
+        num_days = st.sidebar.number_input('Days of data:', min_value=1, max_value=MAX_HISTORY_DAYS,
+                                           value=min(len(self.dates), MAX_HISTORY_DAYS), step=1)
+        self.dates = self.date_window(int(num_days), end_date=self.dates[0])
+        self.available_dates = self.dates
+        return
+
+    def is_today(self, date: str) -> bool:
+        """
+        check if a date is the current day at the feeder
+        :param date: date string in the format yyyy-mm-dd
+        :return: True if the date is today
+        """
+        return date == datetime.now(self.Tz).strftime('%Y-%m-%d')
+
+    def cache_ttl(self, date: str) -> int:
+        """
+        time to live for a cached day of data, today's files change all day while prior days are complete
+        :param date: date string in the format yyyy-mm-dd
+        :return: ttl in seconds
+        """
+        return CACHE_TTL_TODAY if self.is_today(date) else CACHE_TTL_PAST_DAY
+
+    @staticmethod
+    @timed_stage('read_csv_cached')
+    def read_csv_cached(url: str, date: str, ttl: int, prepare=None, incremental: bool = False,
+                        snapshot: str = None) -> pandas.DataFrame:
+        """
+        read a csv from the web using the process wide cache.  expired entries are revalidated with a conditional
+        get and the cached df is reused when the server answers 304 not modified, the file is only downloaded and
+        parsed when it is missing from the cache or has changed.
+        in incremental mode the file is assumed to only grow, e.g., today's webstream.csv, and a changed file is
+        read with a range request starting at the byte offset already parsed so only the new rows are parsed and
+        appended to the cached df.
+        when the bucket can not be reached to revalidate an expired entry the cached df is served for a short time
+        instead, only a file that was never read is reported as missing.  a file deleted from the bucket, 404 or
+        410, is dropped from the cache and the snapshot store and reported as missing
+        with a snapshot name the prepared df is also saved to the local snapshot store, on a cold start the
+        snapshot is revalidated with a conditional get and loaded instead of downloading and parsing the csv
+        :param url: full url of the csv file
+        :param date: date the file belongs to, part of the cache key
+        :param ttl: seconds to keep the parsed file in the cache
+        :param prepare: optional function applied to the parsed rows before they are cached
+        :param incremental: True to fetch only the bytes added since the last read
+        :param snapshot: optional name to keep a local columnar snapshot of the prepared df, a hash of the url is
+            appended so each url prefix has its own snapshot
+        :return: parsed df, shared across sessions so it must not be modified in place
+        """
+        key = (url, date)
+        if snapshot is not None:  # name stays first so day snapshots still start with their date for pruning
+            snapshot = f'{snapshot}-{hashlib.sha1(url.encode()).hexdigest()[:12]}'
+        df = DATA_CACHE.get(key)
+        if df is not None:
+            TIMINGS.record('read_csv_cached', cache_hits=1)
+            return df
+        df_stale, validators = DATA_CACHE.get_stale(key)
+        if df_stale is None and snapshot is not None:  # cold start, revalidate the local snapshot
+            df_stale, validators = SNAPSHOTS.load(snapshot)
+        request_headers = conditional_headers(validators) if df_stale is not None else {}
+        offset = validators.get('offset', 0) if incremental and df_stale is not None else 0
+        if offset > 0:
+            request_headers['Range'] = f'bytes={offset}-'
+        try:
+            status, headers, body = fetch_response(url, headers=request_headers)
+            if status == 416:  # range past the end, nothing new unless the file was replaced by a smaller one
+                file_size = headers.get('Content-Range', '').rpartition('/')[2]
+                if not file_size.isdigit() or int(file_size) < offset:
+                    status, headers, body = fetch_response(url)  # start over with the whole file
+                    offset = 0
+        except urllib.error.URLError as e:  # includes HTTPError
+            if isinstance(e, HTTPError) and e.code not in FETCH_RETRY_STATUS:  # a final answer, not an outage
+                if e.code in (404, 410):  # deleted from the bucket, never serve its old rows again
+                    DATA_CACHE.discard(key)
+                    if snapshot is not None:
+                        SNAPSHOTS.remove(snapshot)
+                raise
+            if df_stale is None:  # nothing cached, the caller reports the file as missing
+                raise
+            print(f'unable to revalidate {url}, serving cached rows: {e}')
+            TIMINGS.record('read_csv_cached', stale_served=1)
+            DATA_CACHE.put(key, df_stale, CACHE_TTL_STALE, validators)  # try again soon
+            return df_stale
+        if status in (304, 416):  # unchanged on the server, keep the parsed df
+            TIMINGS.record('read_csv_cached', revalidated=1)
+            if not DATA_CACHE.refresh(key, ttl):  # df came from the snapshot store
+                DATA_CACHE.put(key, df_stale, ttl, validators)
+            return df_stale
+        new_validators = {'ETag': headers.get('ETag'), 'Last-Modified': headers.get('Last-Modified')}
+        if status == 206:  # tail of the file, parse complete lines only and append them to the cached rows
+            tail_end = body.rfind(b'\n') + 1  # a partial last line is left for the next read
+            df = df_stale
+            if tail_end > 0:
+                df_tail = pd.read_csv(io.BytesIO(body[:tail_end]), header=None, names=validators['columns'])
+                df_tail = prepare(df_tail) if prepare is not None else df_tail
+                df = pd.concat([df_stale, df_tail], ignore_index=True)
+                TIMINGS.record('read_csv_cached', parsed_rows=len(df_tail))
+            new_validators['offset'] = offset + tail_end
+            new_validators['columns'] = validators['columns']
+        else:  # whole file
+            df = pd.read_csv(io.BytesIO(body))
+            TIMINGS.record('read_csv_cached', parsed_rows=len(df), downloads=1)
+            new_validators['offset'] = len(body)
+            new_validators['columns'] = list(df.columns)
+            df = prepare(df) if prepare is not None else df
+        DATA_CACHE.put(key, df, ttl, new_validators)
+        if snapshot is not None:
+            SNAPSHOTS.save(snapshot, df, new_validators)
+        return df
+
+    def fetch_day_files(self, file_names: list) -> dict:
+        """
+        fetch the file for every date in self.dates for each file name concurrently using the process fetch pool.
+        results come from the cache when available so callers can use this to warm the cache for several loaders.
+        prior days are complete so they are also kept as local snapshots and survive a restart
+        :param file_names: list of file suffixes to fetch for each date, e.g., webstream.csv
+        :return: dict keyed by (file name, date) with the parsed df or None if the file was not found
+        """
+        prepare_functions = {'web_occurrences.csv': self.prepare_occurrences,
+                             'webstream.csv': self.prepare_message_stream}
+        futures = {}
+        frames = {}
+        for file_name in file_names:
+            for date in self.dates:
+                if DATA_CACHE.get(('exists', self.url_prefix + date + file_name)) is False:  # known to be missing
+                    frames[(file_name, date)] = None
+                    continue
+                today = self.is_today(date)  # today's files only grow, prior days never change
+                futures[(file_name, date)] = FETCH_POOL.submit(self.read_csv_cached, self.url_prefix + date + file_name,
+                                                               date, self.cache_ttl(date),
+                                                               prepare_functions.get(file_name), today,
+                                                               None if today else date + file_name)
+        for (file_name, date), future in futures.items():
+            try:
+                frames[(file_name, date)] = future.result()
+            except urllib.error.URLError as e:
+                print(f'no {file_name} found for {date}')
+                print(e)
+                frames[(file_name, date)] = None
+                DATA_CACHE.put(('exists', self.url_prefix + date + file_name), False, CACHE_TTL_IMAGE_MISSING)
+        return frames
+
+    def expire_today(self) -> None:
+        """
+        expire the cached copies of today's files so the next load revalidates them with the bucket, today's files
+        change all day while prior days do not
+        :return: None
+        """
+        for date in [date for date in self.dates if self.is_today(date)]:
+            for file_name in ('web_occurrences.csv', 'webstream.csv'):
+                DATA_CACHE.expire((self.url_prefix + date + file_name, date))
+                DATA_CACHE.expire(('exists', self.url_prefix + date + file_name))  # may have been uploaded since
+        return
+
+    @timed_stage('load_feeder_data')
+    def load_feeder_data(self) -> None:
+        """
+        load the bird occurrences and message stream, all day files for both are fetched in parallel first
+        so the page waits on the slowest file rather than the sum of all of them
+        :return: None
+        """
+        self.day_frames = self.fetch_day_files(['web_occurrences.csv', 'webstream.csv'])  # warm the cache for both
+        self.df_occurrences = self.load_bird_occurrences()  # stream of bird occurrences for graph
+        self.birds = self.df_occurrences['Common Name'].unique()
+        self.df_msg_stream = self.load_message_stream()  # message stream from device
+        return
+
+    def shared_data(self, refresh: bool = False, load: bool = True):
+        """
+        get the feeder data shared by all sessions and pages for this page's dates, loading it if needed.
+        the history is shared separately, see shared_history
+        :param refresh: True to reload the data even if it is already loaded, it is only rebuilt if a day changed
+        :param load: False to only return data that is already loaded
+        :return: FeederData, or None if load is False and nothing is loaded
+        """
+        key = ('feeder data', self.url_prefix, tuple(self.dates))  # requested dates, load may drop missing days
+        data = DATA_CACHE.get(key)
+        if (data is None or refresh) and load:
+            if data is not None and data.same_frames(self.fetch_day_files(['web_occurrences.csv', 'webstream.csv'])):
+                TIMINGS.record('shared_data', unchanged=1)  # every file answered not modified, keep the data
+            else:
+                self.load_feeder_data()
+                data = FeederData(self)
+            DATA_CACHE.put(key, data, FEEDER_DATA_MAX_AGE)  # swap in the new data, readers keep the old until done
+        if load:
+            start_background_refresh(self.url_prefix)  # keep the data warm from now on
+        return data
+
+    def shared_history(self, refresh: bool = False) -> pandas.DataFrame:
+        """
+        daily history shared by all sessions and pages, loaded by the first page that needs it
+        :param refresh: True to revalidate the history with the bucket and reload it
+        :return: df with daily history for line graph, treat it as read only
+        """
+        key = ('feeder history', self.url_prefix)
+        if refresh:  # expire the cached file too or the reload is served from the cache without asking the bucket
+            DATA_CACHE.expire((self.url_prefix + 'daily_history.csv', ''))
+        df = None if refresh else DATA_CACHE.get(key)
+        if df is None:
+            df = self.load_daily_history()
+            if df is not None:
+                DATA_CACHE.put(key, df, CACHE_TTL_HISTORY)
+        return df
+
+    def shared_trends(self, refresh: bool = False, min_count: int = 1) -> TrendsEngine:
+        """
+        trends engine for the shared daily history, rebuilt only when the history is reloaded
+        :param refresh: True to reload the history even if it is already loaded
+        :param min_count: daily counts at or below this are dropped
+        :return: TrendsEngine, shared so treat it as read only
+        """
+        df = self.shared_history(refresh=refresh)
+        key = ('feeder trends', self.url_prefix, min_count)
+        trends = DATA_CACHE.get(key)
+        if trends is None or trends.history is not df:
+            trends = TrendsEngine(df, min_count)
+            DATA_CACHE.put(key, trends, CACHE_TTL_HISTORY)
+        return trends
+
+    def load_shared_data(self, refresh: bool = False) -> None:
+        """
+        set the shared feeder data on this page, see shared_data
+        :param refresh: True to revalidate today's files with the bucket and reload the data
+        :return: None
+        """
+        if refresh:
+            self.expire_today()
+        self.shared_data(refresh=refresh).apply(self)
+        return
+
+    def prepare_occurrences(self, df: pandas.DataFrame) -> pandas.DataFrame:
+        """
+        parse the date and derive the time columns for a single day of occurrences, done once per cached day
+        so loading more days only adds the work for the new days
+        :param df: raw df read from web_occurrences.csv
+        :return: df with date time column as a datetime and the time features
+        """
+        df['Date Time'] = pd.to_datetime(df['Date Time'])
+        return self.compact(self.add_time_features(df), string_cols=['Feeder Name', 'Species'])
+
+    def prepare_message_stream(self, df: pandas.DataFrame) -> pandas.DataFrame:
+        """
+        compact the text columns for a single day of the message stream, done once per cached day
+        :param df: raw df read from webstream.csv
+        :return: df with arrow backed strings and downcast numbers
+        """
+        return self.compact(df, string_cols=['Feeder Name', 'Message Type', 'Message', 'Image Name'])
+
+    @staticmethod
+    def add_time_features(df: pandas.DataFrame) -> pandas.DataFrame:
+        """
+        derive the hour, day.hour, and date columns from the date time column using the datetime accessors
+        :param df: df with a datetime date time column
+        :return: df with hour as hh + mm/60, day.hour as dd + hh/100 + mm/6000, and date at midnight for filtering
+        """
+        date_time = df['Date Time'].dt
+        hours, minutes = date_time.hour, date_time.minute
+        df['Hour'] = hours + minutes / 60
+        df['Day.Hour'] = date_time.day + hours / 100 + minutes / 100 / 60
+        df['Date'] = date_time.normalize()
+        return df
+
+    @staticmethod
+    def prepare_daily_history(df: pandas.DataFrame) -> pandas.DataFrame:
+        """
+        build the year-day date column and sort the daily history
+        :param df: raw df read from daily_history.csv
+        :return: df sorted by date
+        """
+        df = df.drop(['Unnamed: 0'], axis='columns')
+        df['Year-Day'] = pd.to_datetime(df[['Year', 'Month', 'Day']].astype(int))  # calendar date from the columns
+        df['Day_of_Year'] = df['Year-Day'].dt.dayofyear
+        df['Year'] = df['Year'].astype(int)
+        df = df.sort_values('Year-Day', ascending=True)
+        df = WebPages.compact(df.astype({'Month': int, 'Day': int}), category_cols=['Common Name'])
+        return df
+
+    @timed_stage('build_common_name')
     def build_common_name(self, df: pandas.DataFrame, target_col: str) -> pandas.DataFrame:
         """
         builds common names for the birds from a target col, sets a common color palette for use in graphing
@@ -119,18 +1453,14 @@ class WebPages:
         :param target_col: column name to extract the common names from
         :return: new dataframe with common name column
         """
-        df['Common Name'] = df[target_col]
-        df['Common Name'] = [name[name.find(' ') + 1:] if name.find(' ') >= 0 else name
-                             for name in df['Common Name']]
-        df['Common Name'] = [name[name.find('(') + 1: name.find(')')] if name.find('(') >= 0 else name
-                             for name in df['Common Name']]
-        # build color map so each chart uses the same color for each species
+        df['Common Name'] = SPECIES_NAMES.common_names(df[target_col])  # memo table, each label parsed once
+        # build color map so each chart uses the same color for each species, shared and read only
         self.common_names = sorted(df['Common Name'].unique())
         self.common_names = [name for name in self.common_names if name not in FILTER_BIRD_NAMES]
-        self.bird_color_map_hist = dict(zip(self.common_names, colors.sequential.Viridis))
-        self.bird_color_map = dict(zip(self.common_names, self.cmap(range(len(self.common_names)))))
+        self.bird_color_map_hist, self.bird_color_map = SPECIES_NAMES.color_maps_for(self.common_names)
         return df
 
+    @timed_stage('load_message_stream')
     def load_message_stream(self) -> pandas.DataFrame:
         """
         builds an empty data frame, reads for csv for each date and merges them into on df
@@ -138,16 +1468,13 @@ class WebPages:
         """
         df = pd.DataFrame(data=None, columns=['Unnamed: 0', 'Feeder Name', 'Event Num', 'Message Type',
                                               'Date Time', 'Message', 'Image Name'], dtype=None)
-        for date in self.dates:
-            try:  # read csvs from web, 3 days and concat
-                urllib.request.urlretrieve(self.url_prefix + date + 'webstream.csv', 'webstream.csv')
-                df_read = pd.read_csv('webstream.csv')
-                df = pd.concat([df, df_read])
-            except urllib.error.URLError as e:
-                print(f'no web stream found for {date}')
-                print(e)
-                self.dates.remove(date)  # remove date if not found
-                pass
+        frames = self.fetch_day_files(['webstream.csv'])  # read csvs from web or cache in parallel
+        missing_dates = [date for date in self.dates if frames[('webstream.csv', date)] is None]
+        df_days = [frames[('webstream.csv', date)] for date in self.dates  # concat in date order
+                   if date not in missing_dates]
+        df = pd.concat(df_days) if len(df_days) > 0 else df  # empty df only without days, it would widen dtypes
+        for date in missing_dates:
+            self.dates.remove(date)  # remove date if not found, after the loop so no dates are skipped
         df['Date Time'] = pd.to_datetime(df['Date Time'])
         df = self.build_common_name(df, 'Message')
         df = df.drop(['Unnamed: 0'], axis='columns')
@@ -157,8 +1484,11 @@ class WebPages:
         df = df.reindex(columns=new_col_order)
         self.feeders = list(df['Feeder Name'].unique())
         df = df.sort_values('Date Time', ascending=False)
+        df = self.compact(df, category_cols=['Feeder Name', 'Message Type', 'Common Name'],
+                          string_cols=['Message', 'Image Name'])
         return df
 
+    @timed_stage('load_bird_occurrences')
     def load_bird_occurrences(self, drop_old_model_species: bool = True) -> pandas.DataFrame:
         """
         setup df with birds spotted
@@ -168,28 +1498,39 @@ class WebPages:
         # df = pd.DataFrame(data=None, columns=['Unnamed: 0', 'Feeder Name', 'Species',
         #                                       'Date Time', 'Hour'], dtype=None)  # setup df like file
         # df['Date Time'] = pd.to_datetime(df['Date Time'])
-        df = None
-        for date in self.dates:
-            try:  # read 3 days of files
-                urllib.request.urlretrieve(self.url_prefix + date + 'web_occurrences.csv', 'web_occurrences.csv')
-                df_read = pd.read_csv('web_occurrences.csv')
-                df_read['Date Time'] = pd.to_datetime(df_read['Date Time'])
-                df_read['Hour'] = pd.to_numeric(df_read['Date Time'].dt.strftime('%H')) + \
-                    pd.to_numeric(df_read['Date Time'].dt.strftime('%M')) / 60
-                df_read['Day.Hour'] = pd.to_numeric(df_read['Date Time'].dt.strftime('%d')) + \
-                    pd.to_numeric(df_read['Date Time'].dt.strftime('%H')) / 100 + \
-                    pd.to_numeric(df_read['Date Time'].dt.strftime('%M')) / 100 / 60
-                df = pd.concat([df, df_read]) if df is not None else df_read  # handle empty df on first loop
-            except urllib.error.URLError as e:
-                print(f'no web occurrences found for {date}')
-                print(e)
-                # self.dates.remove(date)  # remove date if not found ?? does this create the early day blank error on the prior day?
+        frames = self.fetch_day_files(['web_occurrences.csv'])  # read days of files from web or cache in parallel
+        df_days = [frames[('web_occurrences.csv', date)] for date in self.dates  # concat in date order
+                   if frames[('web_occurrences.csv', date)] is not None]
+        df = pd.concat(df_days) if len(df_days) > 0 else None  # one concat, new df so the cached days are not changed
+        if df is None:  # no days found, empty df with the prepared columns
+            df = self.prepare_occurrences(pd.DataFrame(columns=['Unnamed: 0', 'Feeder Name', 'Species', 'Date Time']))
         df = self.build_common_name(df, 'Species')  # build common name for merged df
         df = df.drop(['Unnamed: 0'], axis='columns')
         if drop_old_model_species:  # the old model made pred errors, this filter drops the more obvious errors
             df = df[~df['Common Name'].isin(FILTER_BIRD_NAMES)]  # get rid of species from old model
+        df = self.compact(df, category_cols=['Feeder Name', 'Common Name', 'Species'])
         return df
 
+    @staticmethod
+    def compact(df: pandas.DataFrame, category_cols: list = (), string_cols: list = ()) -> pandas.DataFrame:
+        """
+        shrink a df for long lived storage, low cardinality columns become categoricals, high cardinality text
+        becomes arrow backed strings when pyarrow is installed, and numeric columns are downcast to the smallest
+        dtype that holds their values
+        :param df: df to convert
+        :param category_cols: low cardinality string columns, e.g., feeder name
+        :param string_cols: high cardinality string columns, e.g., message text or image name
+        :return: new df with compact dtypes
+        """
+        dtypes = {col: 'category' for col in category_cols}
+        if PYARROW_AVAILABLE:
+            dtypes.update({col: 'string[pyarrow]' for col in string_cols})
+        df = df.astype(dtypes)
+        downcast = {col: pd.to_numeric(df[col], downcast='integer') for col in df.select_dtypes('integer').columns}
+        downcast.update({col: pd.to_numeric(df[col], downcast='float') for col in df.select_dtypes('float').columns})
+        return df.assign(**downcast) if len(downcast) > 0 else df
+
+    @timed_stage('load_daily_history')
     def load_daily_history(self, drop_old_model_species: bool = True) -> pandas.DataFrame:
         """
         loads the history for all days and months with summarized counts by day
@@ -197,15 +1538,9 @@ class WebPages:
         :return: df with daily history for line graph
         """
         df = None
-        try:
-            urllib.request.urlretrieve(self.url_prefix + 'daily_history.csv', 'daily_history.csv')
-            df = pd.read_csv('daily_history.csv')
-            df = df.drop(['Unnamed: 0'], axis='columns')
-            df['Day_of_Year'] = (df['Month'] -1) * 30 + df['Day']
-            df['Year'] = df['Year'].astype(str).str[:-2]
-            df['Year-Day'] = df['Year'] + '.' + df['Day_of_Year'].astype(str).str[:-2].str.rjust(3, '0')
-            df['Year-Day'] = pd.to_datetime(df['Year-Day'], format='%Y.%j')
-            df = df.sort_values('Year-Day', ascending=True)
+        try:  # history is a single file for all dates, key it without a date
+            df = self.read_csv_cached(self.url_prefix + 'daily_history.csv', '', CACHE_TTL_HISTORY,
+                                      prepare=self.prepare_daily_history, snapshot='daily_history')
             if drop_old_model_species:
                 df = df[~df['Common Name'].isin(FILTER_BIRD_NAMES)]  # get rid of species from old model
         except urllib.error.URLError as e:
@@ -213,6 +1548,88 @@ class WebPages:
             print(e)
         return df
 
+    @staticmethod
+    @timed_stage('load_archive_list')
+    def load_archive_list(file_name: str = 'archive-jpg-list.csv') -> pandas.DataFrame:
+        """
+        loads the list of archived images, the parsed list is kept in the local snapshot store and reused until
+        the csv changes
+        :param file_name: csv file with the list of images in the archive
+        :return: df indexed by image number with a random sample column
+        """
+        stat = os.stat(file_name)
+        signature = {'file': os.path.abspath(file_name), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+        df, saved_signature = SNAPSHOTS.load('archive-jpg-list')
+        if df is not None and saved_signature == signature:
+            return df
+        df = pd.read_csv(file_name)
+        df['DateTime'] = pd.to_datetime(df['DateTime'], errors='raise')
+        df = df.drop(['Image Number', 'Year', 'Day'], axis=1)
+        df.index.name = 'Image Number'
+        if 'Random Sample' not in df.columns:
+            df['Random Sample'] = False  # Initialize all checkboxes to False
+        df = WebPages.compact(df, category_cols=['Species'], string_cols=['Image Name'])
+        SNAPSHOTS.save('archive-jpg-list', df, signature)
+        return df
+
+    @timed_stage('check_images')
+    def check_images(self, image_names: list, url_prefix: str = None) -> dict:
+        """
+        check which images exist using one concurrent batch of head requests, results are cached per image
+        for the process so repeat checks are free
+        :param image_names: list of image names
+        :param url_prefix: string containing url_prefix will be set to self.url_prefix is not passed
+        :return: dict of image name: True if the image exists
+        """
+        url_prefix = self.url_prefix if url_prefix is None else url_prefix
+        image_exists = {}
+        futures = {}
+        for image_name in image_names:
+            if not isinstance(image_name, str) or image_name == '' or image_name == '<NA>':
+                image_exists[image_name] = False
+                continue
+            found = DATA_CACHE.get(('exists', url_prefix + image_name))
+            if found is not None:
+                image_exists[image_name] = found
+            elif image_name not in futures:
+                futures[image_name] = FETCH_POOL.submit(url_exists, url_prefix + image_name)
+        for image_name, future in futures.items():
+            image_exists[image_name] = future.result()
+            DATA_CACHE.put(('exists', url_prefix + image_name), image_exists[image_name],
+                           CACHE_TTL_IMAGE_FOUND if image_exists[image_name] else CACHE_TTL_IMAGE_MISSING)
+        return image_exists
+
+    def thumbnail_or_none(self, image_name: str, url_prefix: str = None, size: tuple = THUMBNAIL_SIZE,
+                          first_frame: bool = True):
+        """
+        thumbnail for an image name, None if the image is missing or can not be read
+        :param image_name: name of the image
+        :param url_prefix: string containing url_prefix will be set to self.url_prefix is not passed
+        :param size: tuple of max width and height
+        :param first_frame: True to use only the first frame of an animated gif
+        :return: thumbnail bytes or None
+        """
+        url_prefix = self.url_prefix if url_prefix is None else url_prefix
+        if not isinstance(image_name, str) or image_name == '' or image_name == '<NA>':
+            return None
+        if DATA_CACHE.get(('exists', url_prefix + image_name)) is False:  # known to be missing
+            return None
+        if DATA_CACHE.get(('thumb_failed', url_prefix + image_name)) or DATA_CACHE.get(('thumb_failed', url_prefix)):
+            return None  # failed recently, do not pay the retries again
+        try:
+            return get_thumbnail(url_prefix + image_name, size, first_frame=first_frame)
+        except HTTPError:  # missing file, remember it like check_images does
+            DATA_CACHE.put(('exists', url_prefix + image_name), False, CACHE_TTL_IMAGE_MISSING)
+            return None
+        except urllib.error.URLError as e:  # host unreachable after the retries, skip its other images for a while
+            print(f'unable to build thumbnail for {url_prefix}{image_name}: {e}')
+            DATA_CACHE.put(('thumb_failed', url_prefix), True, CACHE_TTL_IMAGE_MISSING)
+            return None
+        except Exception as e:  # unreadable image, try again after a short while
+            print(f'unable to build thumbnail for {url_prefix}{image_name}: {e}')
+            DATA_CACHE.put(('thumb_failed', url_prefix + image_name), True, CACHE_TTL_IMAGE_MISSING)
+            return None
+
     def set_caption(self, current_image_num: int) -> str:
         """
         pulls the image file name and parses the name for the date and times, formats a string
@@ -226,25 +1643,42 @@ class WebPages:
         caption = f'date: {image_date}  time: {image_time}'
         return caption
 
-    def publish_row_of_images(self, starting_col: int = 0, url_prefix: str=None) -> None:
+    @timed_stage('publish_row_of_images')
+    def publish_row_of_images(self, starting_col: int = 0, url_prefix: str=None, thumbnail_size: tuple = None,
+                              first_frame: bool = True, num_images: int = None) -> None:
         """
         publish a row of images with a set number of images per row in num_image_cols
         :param starting_col: starting position in list
         :param url_prefix: string containing url_prefix will be set to self.url_prefix is not passed
+        :param num_images: images to publish in this row, defaults to num_image_cols
+        :param thumbnail_size: tuple of max width and height to publish server side thumbnails, None for full images
+        :param first_frame: with thumbnails, True to show only the first frame of animated gifs
         :return: None
         """
         url_prefix = self.url_prefix if url_prefix is None else url_prefix
+        num_images = self.num_image_cols if num_images is None else min(num_images, self.num_image_cols)
+        row_names = self.image_names[starting_col:starting_col + num_images]
+        thumbnails = {}
+        if thumbnail_size is not None:  # build the row of thumbnails concurrently, cached for the process
+            thumbnails = dict(zip(row_names, THUMBNAIL_POOL.map(
+                lambda image_name: self.thumbnail_or_none(image_name, url_prefix, thumbnail_size, first_frame),
+                row_names)))
+            image_exists = {image_name: thumbnail is not None for image_name, thumbnail in thumbnails.items()}
+        else:  # check the whole row in one concurrent batch, the browser is the only one to download the images
+            image_exists = self.check_images(row_names, url_prefix)
         try:  # catch error with less than X images for row
             cols = st.columns(self.num_image_cols)  # set web page with x number of images
-            for col in range(0, self.num_image_cols):  # cols 0 to 5 for 5 columns
+            for col in range(0, num_images):  # cols 0 to 5 for 5 columns
                 try:  # catch missing image
-                    urllib.request.urlretrieve(url_prefix + self.image_names[col+starting_col], 'imgfile')
+                    if not image_exists.get(self.image_names[col+starting_col], False):
+                        raise FileNotFoundError(self.image_names[col+starting_col])
                     # use alternative method below to open file to get animation instead of Pillow Image.open(url)
                     with cols[col]:
-                        st.image(url_prefix + self.image_names[col+starting_col],
+                        st.image(thumbnails.get(self.image_names[col+starting_col],
+                                                url_prefix + self.image_names[col+starting_col]),
                                  caption=self.set_caption(starting_col+col))
                         st.write(f'{url_prefix + self.image_names[col+starting_col]}', unsafe_allow_html=True)
-                except FileNotFoundError:  # missing file
+                except (FileNotFoundError, HTTPError):  # missing file
                     cols[col].write(f'missing file {self.image_names[col+starting_col]}')
                 except Exception as e:  # missing file
                     st.write(self.image_names[col+starting_col])
@@ -255,24 +1689,66 @@ class WebPages:
             print(e)
         return
 
+    @timed_stage('publish_image_gallery')
+    def publish_image_gallery(self, key: str, url_prefix: str = None, thumbnail_size: tuple = None,
+                              first_frame: bool = True) -> None:
+        """
+        publish self.image_names as a paged gallery, only the images on the current page are checked and rendered
+        so the cost is bounded by the page size instead of the number of images.  the page number is kept in the
+        session state and goes back to the first page when the list of images changes
+        :param key: unique name for the gallery widgets and session state
+        :param url_prefix: string containing url_prefix will be set to self.url_prefix is not passed
+        :param thumbnail_size: tuple of max width and height to publish server side thumbnails, None for full images
+        :param first_frame: with thumbnails, True to show only the first frame of animated gifs
+        :return: None
+        """
+        page_key, list_key = f'{key}_page', f'{key}_image_list'
+        image_list = (len(self.image_names), self.image_names[0] if len(self.image_names) > 0 else None)
+        if st.session_state.get(list_key) != image_list:  # new filter results, start over on the first page
+            st.session_state[list_key] = image_list
+            st.session_state[page_key] = 0
+        page_size_options = sorted({self.num_image_cols * rows for rows in (2, 5, 10, 20)} | {self.gallery_page_size})
+        page_size = st.selectbox('Images per page:', page_size_options,
+                                 index=page_size_options.index(self.gallery_page_size), key=f'{key}_page_size')
+        num_pages = max(1, math.ceil(len(self.image_names) / page_size))
+        page = min(st.session_state.get(page_key, 0), num_pages - 1)  # page size may have changed
+        st.session_state[page_key] = page
+
+        def change_page(step: int) -> None:  # button callback, runs before the next rerun renders the page
+            st.session_state[page_key] = min(max(st.session_state[page_key] + step, 0), num_pages - 1)
+
+        nav_cols = st.columns([1, 1, 4])
+        nav_cols[0].button('Prev', key=f'{key}_prev', disabled=page == 0, on_click=change_page, args=(-1,))
+        nav_cols[1].button('Next', key=f'{key}_next', disabled=page >= num_pages - 1, on_click=change_page, args=(1,))
+        nav_cols[2].write(f'Page {page + 1} of {num_pages}, {len(self.image_names)} images')
+        page_start = page * page_size
+        page_end = min(page_start + page_size, len(self.image_names))
+        if url_prefix is None and thumbnail_size is None:  # check the whole page in one batch, rows hit the cache
+            self.check_images(self.image_names[page_start:page_end])
+        for row_start in range(page_start, page_end, self.num_image_cols):
+            self.publish_row_of_images(starting_col=row_start, url_prefix=url_prefix, thumbnail_size=thumbnail_size,
+                                       first_frame=first_frame, num_images=page_end - row_start)
+        return
+
+    @timed_stage('publish_first_image')
     def publish_first_image(self) -> None:
         """
         publishes the first image in the list to the web
         :return: None
         """
-        for image_name in self.image_names:
-            if image_name != '' and image_name != "<NA>":
-                try:
-                    urllib.request.urlretrieve(self.url_prefix + image_name, 'imgfile')
+        image_names = [image_name for image_name in self.image_names
+                       if isinstance(image_name, str) and image_name != '' and image_name != "<NA>"]
+        for batch_start in range(0, len(image_names), FETCH_WORKERS):  # check a batch of images at a time
+            batch = image_names[batch_start:batch_start + FETCH_WORKERS]
+            image_exists = self.check_images(batch)
+            for image_name in batch:
+                if image_exists[image_name]:
                     st.image(self.url_prefix + image_name, caption=f'Seed Check Image: {image_name}')
                     return  # only need the first image, fall out of function
-                except FileNotFoundError:  # missing file
-                    st.write(f'missing file {image_name}')
-                except Exception as e:  # missing file
-                    print(image_name)
-                    print(e)
+                st.write(f'missing file {image_name}')
         return
 
+    @timed_stage('filter_occurrences')
     def filter_occurrences(self, feeder_options: list, date_options: list, bird_options: list,
                            drop_old_model_species: bool=True) -> pandas.DataFrame:
         """
@@ -283,16 +1759,17 @@ class WebPages:
         :param drop_old_model_species: drop species in error by model
         :return: df with filtered list of data
         """
-        df = self.df_occurrences
-        df = df[df['Feeder Name'].isin(feeder_options)]
-        df = df[df['Date Time'].dt.strftime('%Y-%m-%d').isin(date_options)]  # compare y m d to date selection y m d
+        if self.occurrences_index is None or self.occurrences_index.df is not self.df_occurrences:
+            self.occurrences_index = FrameIndex(self.df_occurrences, self.df_occurrences['Date'])
+        index = self.occurrences_index
+        positions = index.positions(date_options, feeder_options)  # rows for the selected dates and feeders
         if drop_old_model_species:  # the old model made pred errors, this filter drops the more obvious errors
-            df = df[~df['Common Name'].isin(FILTER_BIRD_NAMES)]  # get rid of species from old model
+            positions = positions[~index.mask(positions, 'Common Name', FILTER_BIRD_NAMES)]  # species from old model
         if 'All' not in bird_options or ('All' in bird_options and len(bird_options) > 1):
-            print(bird_options)
-            df = df[df['Common Name'].isin(bird_options)]  # return birds if something is selected
-        return df
+            positions = positions[index.mask(positions, 'Common Name', list(bird_options))]  # birds if selected
+        return index.select(positions)
 
+    @timed_stage('filter_message_stream')
     def filter_message_stream(self, feeder_options: list, date_options: list, bird_options: list,
                               message_options: list) -> pandas.DataFrame:
         """
@@ -305,28 +1782,81 @@ class WebPages:
         """
         message_type_translation = {'Animated': 'spotted', 'Static': 'possible', 'message': 'message'}
         message_types = [message_type_translation[value] for value in message_options]
-        df = self.df_msg_stream[self.df_msg_stream['Message Type'].isin(message_types)]
-        df = df[df['Feeder Name'].isin(feeder_options)]
-        df = df[df['Date Time'].dt.strftime('%Y-%m-%d').isin(date_options)]  # compare y m d to date selection y m d
+        if self.msg_stream_index is None or self.msg_stream_index.df is not self.df_msg_stream:
+            self.msg_stream_index = FrameIndex(self.df_msg_stream, self.df_msg_stream['Date Time'].dt.normalize())
+        index = self.msg_stream_index
+        positions = index.positions(date_options, feeder_options)  # rows for the selected dates and feeders
+        positions = positions[index.mask(positions, 'Message Type', message_types)]
         if 'All' not in bird_options or ('All' in bird_options and len(bird_options) > 1):
-            df = df[df['Common Name'].isin(bird_options)]  # return all birds if none selected
+            # all birds if none selected
+            positions = positions[index.mask(positions, 'Common Name', list(bird_options))]
+        df = index.select(positions)
         self.image_names = list(df["Image Name"])
         self.available_dates = list(df["Date Time"])
         return df
 
+    @staticmethod
+    def date_time_bin_width(date_times: pandas.Series, nbins: int) -> pandas.Timedelta:
+        """
+        pick a round bin width that splits the span of the date times into about nbins bins
+        :param date_times: series of date times to bin
+        :param nbins: target number of bins
+        :return: bin width
+        """
+        span_minutes = (date_times.max() - date_times.min()).total_seconds() / 60 if len(date_times) > 0 else 0
+        minutes = next((width for width in CHART_BIN_MINUTES if width * nbins >= span_minutes), CHART_BIN_MINUTES[-1])
+        return pd.Timedelta(minutes=minutes)
+
+    @staticmethod
+    @timed_stage('bin_occurrences')
+    def bin_occurrences(df: pandas.DataFrame, x_col: str, bin_width) -> pandas.DataFrame:
+        """
+        count occurrences by species in fixed width bins so charts are built from counts instead of raw rows
+        :param df: occurrences to count
+        :param x_col: column to bin, a date time or a number such as hour
+        :param bin_width: width of each bin, a timedelta for date times or a number
+        :return: df with the bin center in x_col, common name, and count
+        """
+        if isinstance(bin_width, pd.Timedelta):
+            bins = df[x_col].dt.floor(bin_width) + bin_width / 2
+        else:
+            bins = np.floor(df[x_col] / bin_width) * bin_width + bin_width / 2
+        return df.groupby([bins.rename(x_col), 'Common Name'], observed=True).size().reset_index(name='Count')
+
+    @timed_stage('occurrence_bar_chart')
+    def occurrence_bar_chart(self, df: pandas.DataFrame, x_col: str, bin_width, **kwargs):
+        """
+        builds a stacked bar chart of binned occurrence counts by species that looks like a histogram, the chart
+        carries bins x species points regardless of how many occurrences there are
+        :param df: occurrences to chart
+        :param x_col: column to bin on the x axis
+        :param bin_width: width of each bin, a timedelta for date times or a number
+        :param kwargs: additional arguments for px.bar, e.g., width, height, range_x
+        :return: plotly figure
+        """
+        df_bins = self.bin_occurrences(df, x_col, bin_width)
+        fig = px.bar(df_bins, x=x_col, y='Count', color='Common Name',
+                     color_discrete_map=self.bird_color_map_hist,
+                     category_orders={'Common Name': self.common_names}, **kwargs)
+        # plotly takes bar widths in ms on date axes
+        bar_width = bin_width.total_seconds() * 1000 if isinstance(bin_width, pd.Timedelta) else bin_width
+        fig.update_traces(width=bar_width)
+        fig.update_layout(bargap=0)
+        return fig
+
     ######## page functions ######
     def main_page(self) -> None:
         """
         Renders the main page of the website
         :return: None
         """
-        self.df_occurrences = self.load_bird_occurrences()  # stream of bird occurrences for graph
-        self.birds = self.df_occurrences['Common Name'].unique()
-        self.bird_dd_options = list(self.birds) + ['All']
-        self.df_msg_stream = self.load_message_stream()  # message stream from device
         # ****************** format page ********************
         st.set_page_config(layout="wide")
         st.header('Tweeters: Bird Feeder Species Identification')
+        # occurrences for graph and message stream from device, shared by all pages
+        self.select_date_window()
+        self.load_shared_data(refresh=st.sidebar.button('Refresh data'))
+        self.bird_dd_options = list(self.birds) + ['All']
         # feeder multi select filters with expander
         st.write('Select values to include or exclude in the chart and information table.  ')
         dropdown_cols = st.columns(3)
@@ -346,13 +1876,12 @@ class WebPages:
         # data available text and graph
         st.write(f'Interactive Chart of Birds: {min(self.available_dates)} to {max(self.available_dates)}')
         # multi-day
-        fig2 = px.histogram(self.filter_occurrences(feeder_options, date_options, bird_options),
-                            x="Date Time", color='Common Name',
-                            nbins=36, width=650, height=400,
-                            color_discrete_map=self.bird_color_map_hist,
-                            category_orders={'Common Name': self.common_names})
+        df = self.filter_occurrences(feeder_options, date_options, bird_options)
+        fig2 = self.occurrence_bar_chart(df, 'Date Time', self.date_time_bin_width(df['Date Time'], CHART_NBINS),
+                                         width=650, height=400)
         fig2['layout']['xaxis'].update(autorange=True)
-        st.plotly_chart(fig2, use_container_width=True, theme='streamlit', on_select='ignore')
+        with TIMINGS.timed('plotly_chart'):  # figure serialization and send
+            st.plotly_chart(fig2, use_container_width=True, theme='streamlit', on_select='ignore')
 
         # image and message stream multi-select filters
         message_options = st.multiselect(
@@ -366,12 +1895,9 @@ class WebPages:
                      column_config={'Image Link': st.column_config.LinkColumn('Image Link', help='', max_chars=100,)})
 
         # write last 10 images from stream
-        st.write('Last 25 Images: Most Recent to Least Recent')
-        self.publish_row_of_images(starting_col=0)  # col 1 of 5
-        self.publish_row_of_images(starting_col=(0 + self.num_image_cols))  # row 2 of 5 cols starts num_image_cols
-        self.publish_row_of_images(starting_col=(self.num_image_cols * 2))  # row 3 of 5 cols starts num_image_cols * 2
-        self.publish_row_of_images(starting_col=(self.num_image_cols * 3))  # row 4 of 5 cols starts num_image_cols * 3
-        self.publish_row_of_images(starting_col=(self.num_image_cols * 4))  # row 5 of 5 cols starts num_image_cols * 5
+        st.write('Images: Most Recent to Least Recent')
+        # one page of images at a time, downscaled on the server with the animation kept, links go to the full image
+        self.publish_image_gallery('main_gallery', thumbnail_size=THUMBNAIL_SIZE, first_frame=False)
         return
 
     def daily_charts_page(self) -> None:
@@ -379,13 +1905,12 @@ class WebPages:
         renders the daily charts pages, display a bar chart of birds seen by hour for the selected days
         :return: None
         """
-        self.df_occurrences = self.load_bird_occurrences()  # test stream of bird occurrences for graph
-        self.birds = self.df_occurrences['Common Name'].unique()
-        self.df_msg_stream = self.load_message_stream()  # message stream from device
-
         # ****************** format page ********************
         st.set_page_config(layout="wide")
         st.header('Tweeters Web Page: Daily Charts')
+        # occurrences for graph and message stream from device, shared by all pages
+        self.select_date_window()
+        self.load_shared_data(refresh=st.sidebar.button('Refresh data'))
 
         # feeder multi select filters with expander
         with st.expander("Filters for Feeder, Dates, and Birds:"):
@@ -398,13 +1923,12 @@ class WebPages:
         # text and graph for a single day
         for date in self.available_dates:
             st.write(f'Interactive Chart of Birds: {date}')
-            fig1 = px.histogram(self.filter_occurrences(feeder_options, [date], self.birds),
-                                x="Hour", color='Common Name', range_x=[self.min_hr, self.max_hr],
-                                nbins=36, width=650, height=400,
-                                color_discrete_map=self.bird_color_map_hist,
-                                category_orders={'Common Name': self.common_names})
+            fig1 = self.occurrence_bar_chart(self.filter_occurrences(feeder_options, [date], self.birds),
+                                             'Hour', (self.max_hr - self.min_hr) / CHART_NBINS,
+                                             range_x=[self.min_hr, self.max_hr], width=650, height=400)
             fig1['layout']['xaxis'].update(autorange=True)
-            st.plotly_chart(fig1, use_container_width=True, theme="streamlit")
+            with TIMINGS.timed('plotly_chart'):
+                st.plotly_chart(fig1, use_container_width=True, theme="streamlit")
 
         return
 
@@ -416,16 +1940,27 @@ class WebPages:
         """
         st.set_page_config(layout="wide")
         st.header(f'Daily History - May 9th 2023 to Present')
-        df = self.load_daily_history()
-        df = df[df['counts'] > filter_birds_cnt]
-        st.write(f'Trend of Bird Visits by Day.')
+        trends = self.shared_trends(refresh=st.sidebar.button('Refresh data'), min_count=filter_birds_cnt)
+        # range and resolution, auto picks daily, weekly, or monthly so the chart stays a few hundred points
+        first_date, last_date = trends.first_date.date(), trends.last_date.date()
+        select_cols = st.columns([3, 1])
+        with select_cols[0]:
+            date_range = st.slider('Dates:', min_value=first_date, max_value=last_date,
+                                   value=(first_date, last_date), format='YYYY-MM-DD')
+        with select_cols[1]:
+            resolution = st.selectbox('Resolution:', ['Auto', 'Daily'] + list(TREND_ROLLUPS) + list(TREND_AVERAGES))
+        if resolution == 'Auto':
+            resolution = trends.auto_resolution(date_range[0], date_range[1])
+        df = trends.series(resolution, date_range[0], date_range[1])
+        st.write(f'Trend of Bird Visits: {resolution}.')
         st.write(f'Click and drag to select and zoom to a smaller date range.  Double-click to zoom back out.  '
                  f'Click on a bird name in the legend to remove it from the results. '
                  f'Double-click on a bird name in the legend to select only that individual bird.')
         fig1 = px.line(data_frame=df, x='Year-Day', y='counts', color='Common Name', width=650, height=800,
                        color_discrete_map=self.bird_color_map,
-                       category_orders={'Common Name': self.common_names})
-        st.plotly_chart(fig1, use_container_width=True, theme="streamlit")
+                       category_orders={'Common Name': self.common_names}, render_mode='webgl')
+        with TIMINGS.timed('plotly_chart'):
+            st.plotly_chart(fig1, use_container_width=True, theme="streamlit")
         # df = df.drop(['Day_of_Year', 'Year-Day'], axis=1)
         # st.dataframe(df)
         return
@@ -435,10 +1970,11 @@ class WebPages:
         formats the messages page
         :return: None
         """
-        self.df_msg_stream = self.load_message_stream()  # message stream from device
         # ****************** format page ********************
         st.set_page_config(layout="wide")
         st.header('Tweeters Web Page: Feeder Messages')
+        self.select_date_window()
+        self.load_shared_data(refresh=st.sidebar.button('Refresh data'))  # message stream from device
         # feeder multi select filters
         dropdown_cols = st.columns(2)
         with dropdown_cols[0]:
@@ -452,6 +1988,35 @@ class WebPages:
         self.publish_first_image()  # just want one image
         return
 
+    def shared_archive_2024(self) -> pandas.DataFrame:
+        """
+        2024 rows of the archive image list, shared by every session in place of a copy in each session's state
+        :return: df indexed by image number, treat it as read only
+        """
+        key = ('archive 2024', os.path.abspath('archive-jpg-list.csv'))
+        df = DATA_CACHE.get(key)
+        if df is None:
+            df_raw = self.load_archive_list()
+            df = df_raw[df_raw['DateTime'].dt.year == 2024]
+            DATA_CACHE.put(key, df, CACHE_TTL_HISTORY)
+        return df
+
+    @staticmethod
+    def apply_overlay(df: pandas.DataFrame, overlay: dict, col: str = 'Random Sample') -> pandas.DataFrame:
+        """
+        copy of a selection of the shared df with a session's edits applied
+        :param df: selection of a shared df
+        :param overlay: dict of index: value for the rows the session changed
+        :param col: column the overlay values belong to
+        :return: new df the session can modify
+        """
+        df = df.copy()
+        edits = pd.Series(overlay, dtype=bool)
+        edits = edits[edits.index.isin(df.index)]
+        if len(edits) > 0:
+            df.loc[edits.index, col] = edits
+        return df
+
     @staticmethod
     def make_clickable(file_name, url_prefix='https://storage.googleapis.com/archive_jpg_from_birdclassifier/'):
         """Makes a text value clickable in a DataFrame."""
@@ -466,8 +2031,9 @@ class WebPages:
         try:
             if isinstance(image_path_or_bytes, bytes):
                 encoded_string = base64.b64encode(image_path_or_bytes).decode()
-            with open(image_path_or_bytes, 'rb') as image_file:
-                encoded_string = base64.b64encode(image_file.read()).decode()
+            else:
+                with open(image_path_or_bytes, 'rb') as image_file:
+                    encoded_string = base64.b64encode(image_file.read()).decode()
         except FileNotFoundError:
             st.warning(f'Image not found at path: {image_path_or_bytes}')
         except Exception as e:
@@ -501,18 +2067,68 @@ class WebPages:
         Apply this function to a col in a df with image names
         :param row: row of the df
         :param url_prefix: prefix indicating the location of the data in gcs, default to archive loc of training daya
-        :return: svg data
+        :return: jpeg thumbnail data url
         """
-        svg_image = ''
+        thumbnail_url = ''
         # if row['Image Name'] != '' and row['Rejected'] is False and (row['Random Sample'] is True or row['Data Set Selection'] is True):
-        try:  # catch missing image
-            urllib.request.urlretrieve(url_prefix + row['Image Name'], 'imgfile')
-            svg_image = self.jpg_to_svg_data_url('imgfile')
-        except FileNotFoundError:
+        try:  # catch missing image, small server side thumbnail instead of the full jpg wrapped in svg
+            thumbnail_url = self.thumbnail_data_url(get_thumbnail(url_prefix + row['Image Name'], fmt='JPEG'))
+        except (FileNotFoundError, HTTPError):
             st.warning(f'Image not found at path: {url_prefix}{row["Image Name"]}')
         except Exception as e:
             st.error(f'Exception occurred in fetch_thumbnail: {e} {url_prefix}{row["Image Name"]}')
-        return svg_image
+        return thumbnail_url
+
+    def thumbnail_data_url(self, thumbnail: bytes) -> str:
+        """
+        wrap a jpeg thumbnail in a data url for an image column
+        :param thumbnail: jpeg bytes
+        :return: data url string
+        """
+        return 'data:image/jpeg;base64,' + self.image_to_base64(thumbnail)
+
+    @timed_stage('fetch_thumbnails')
+    def fetch_thumbnails(self, image_names: list, url_prefix: str = None, size: tuple = THUMBNAIL_SIZE,
+                         progress=None) -> dict:
+        """
+        batch version of fetch_thumbnail, downloads and downscales the images concurrently in the thumbnail pool.
+        at most THUMBNAIL_WORKERS images of a batch are queued at once, a new one as soon as one finishes, so a
+        large batch takes turns with other sessions' galleries without waiting on its slowest image
+        :param image_names: list of image names
+        :param url_prefix: string containing url_prefix will be set to self.url_prefix is not passed
+        :param size: tuple of max width and height
+        :param progress: optional function called with the count of finished images and the total
+        :return: dict of image name: jpeg data url, empty string for a missing image
+        """
+        url_prefix = self.url_prefix if url_prefix is None else url_prefix
+        unique_names = pd.unique(pd.Series(image_names, dtype=object))
+        total = len(unique_names)
+        report_every = max(1, total // 100)  # about 100 progress updates regardless of the batch size
+        thumbnail_urls = {}
+        slots = threading.BoundedSemaphore(THUMBNAIL_WORKERS)
+        pending = {}  # future: image name
+
+        def build(image_name: str):  # runs in the pool, frees the slot for the next image when done
+            try:
+                return self.thumbnail_or_none(image_name, url_prefix, size)
+            finally:
+                slots.release()
+
+        def collect(futures) -> None:  # record finished images and report progress on this thread
+            for future in futures:
+                thumbnail = future.result()
+                image_name = pending.pop(future)
+                thumbnail_urls[image_name] = self.thumbnail_data_url(thumbnail) if thumbnail is not None else ''
+                done = len(thumbnail_urls)
+                if progress is not None and (done % report_every == 0 or done == total):
+                    progress(done, total)
+
+        for image_name in unique_names:
+            slots.acquire()  # wait for a free slot
+            pending[THUMBNAIL_POOL.submit(build, image_name)] = image_name
+            collect([future for future in pending if future.done()])
+        collect(list(as_completed(pending)))
+        return thumbnail_urls
 
     def model_test_data_management_2024_page(self) -> None:
         """
@@ -528,25 +2144,15 @@ class WebPages:
                  f'generated for a model testing data set.  '
                  f'Images can be excluded from the sample if they are not high quality.')
 
-        # load data and format df
-        if "df" not in st.session_state or st.session_state.df is None:
-            st.warning('Setting session state')
-            st.session_state.df = None
-            df_raw = pd.read_csv('archive-jpg-list.csv')
-            df_raw['DateTime'] = pd.to_datetime(df_raw['DateTime'], errors='raise')
-            df_raw = df_raw.drop(['Image Number', 'Year', 'Day'], axis=1)
-            df_raw.index.name = 'Image Number'
-            if 'Random Sample' not in df_raw.columns:
-                df_raw['Random Sample'] = False  # Initialize all checkboxes to False
-            df = df_raw[df_raw['DateTime'].dt.year == 2024].copy()  # .copy() avoids warnings setting values on slice
-            df_raw['Image Link'] = self.url_prefix_archive + df_raw['Image Name']
-            df_raw['_image_thumbnail'] = ''
-            # df_raw['_image_thumbnail'] = df_filtered.apply(self.fetch_thumbnail, axis=1)
-            st.session_state.df = df
-        else:
-            df = st.session_state.df
+        # load data, the 2024 rows are shared read only by every session and each session keeps only its edits
+        df = self.shared_archive_2024()
+        if 'sample_overlay' not in st.session_state:
+            st.session_state.sample_overlay = {}  # image number: random sample for rows the session has set
+        overlay = st.session_state.sample_overlay
+        # df_raw['_image_thumbnail'] = df_filtered.apply(self.fetch_thumbnail, axis=1)
         # unique_species = df['Species'].unique().tolist()
         name_counts = df['Species'].value_counts()  # pandas series
+        name_counts = name_counts[name_counts > 0]  # species is categorical, drop species with no 2024 rows
 
         # select date range for images and species for images (filtered)
         default_start_date = dtdate(2024, 1, 1)
@@ -563,23 +2169,45 @@ class WebPages:
             filtered_df = df[(df['DateTime'] >= pd.to_datetime(start_date)) &
                              (df['DateTime'] <= pd.to_datetime(end_date) + pd.Timedelta(days=1))]
 
-        st.write(f'\nSpecies with less than 150 occurrences are not selected initially '
-                 f'since they may be false positives: \n\n{name_counts[name_counts <= 150]}')
-        selected_species = st.selectbox('Select a Species', options=name_counts[name_counts > 150].index.tolist(),
-                                                            index=0)
-        df_filtered = filtered_df[filtered_df['Species'] == selected_species]
+        st.write(f'\nSpecies with less than {SAMPLE_MIN_SPECIES_COUNT} occurrences are not selected initially '
+                 f'since they may be false positives: \n\n{name_counts[name_counts <= SAMPLE_MIN_SPECIES_COUNT]}')
 
-        # select random samples
-        num_samples = int(st.slider("Select a sample size:", min_value=10, max_value=100, value=25, step=5))
+        # sample size and seed, samples are spread across months and hours and the same seed gives the same sample
+        sample_cols = st.columns(2)
+        with sample_cols[0]:
+            num_samples = int(st.slider("Select a sample size:", min_value=10, max_value=100, value=25, step=5))
+        with sample_cols[1]:
+            seed = int(st.number_input('Seed:', min_value=0, value=SAMPLE_SEED, step=1,
+                                       help='change the seed to draw a different sample'))
+
+        # test set for every species in one pass, replaces the current samples
+        if st.button(f'Generate Test Set for All Species ({num_samples} per species)'):
+            sampled = stratified_sample(filtered_df, num_samples, seed)
+            overlay.clear()
+            overlay.update(dict.fromkeys(df.index[df['Random Sample']], False))  # drop samples saved with the list
+            overlay.update(dict.fromkeys(sampled, True))
+            st.session_state.sample_seed = seed
+
+        species_options = name_counts[name_counts > SAMPLE_MIN_SPECIES_COUNT].index.tolist()
+        selected_species = st.selectbox('Select a Species', options=species_options, index=0)
+        df_filtered = self.apply_overlay(filtered_df[filtered_df['Species'] == selected_species], overlay)
+
+        # select random samples for the selected species
         if st.button(f'Generate New Sample'):  # The Sample button
-            df_sampled = df_filtered.sample(n=(num_samples if num_samples <= df.shape[0] else df.shape[0])).copy()
-            if df_sampled is None:
-                st.error("Error during sampling. Please check the number of samples.")
-            else:
-                for index in df_sampled.index:
-                    df_filtered.loc[index, 'Random Sample'] = True
+            sampled = stratified_sample(df_filtered, num_samples, seed, min_count=0)  # at most the species' rows
+            df_filtered.loc[sampled, 'Random Sample'] = True  # one index aligned assignment
+            overlay.update(dict.fromkeys(sampled, True))
+            st.session_state.sample_seed = seed
         if st.checkbox("Order by 'Sample Selection' (True first)", value=True):  # Order the DataFrame based random sample
             df_filtered = df_filtered.sort_values(by=['Random Sample'], ascending=False)
+        if st.checkbox('Show preview images', value=False):  # thumbnails for every row, built concurrently and cached
+            progress_bar = st.progress(0.0, text='Loading preview images')
+            thumbnail_urls = self.fetch_thumbnails(
+                df_filtered['Image Name'].tolist(), url_prefix=self.url_prefix_archive,
+                progress=lambda done, total: progress_bar.progress(done / total,
+                                                                   text=f'Loading preview images {done} of {total}'))
+            progress_bar.empty()
+            df_filtered = df_filtered.assign(_image_thumbnail=df_filtered['Image Name'].map(thumbnail_urls))
 
         column_config = {'_image_thumbnail': st.column_config.ImageColumn('Preview Image', width='medium'),
                          'Image Link': st.column_config.LinkColumn()}
@@ -587,9 +2215,11 @@ class WebPages:
                                    disabled=['Image Number', 'Species', 'DateTime', 'Image Name',
                                              '_image_thumbnail', 'Image Link'])
 
-        for index in df_edited.index:
-            df.loc[index, 'Random Sample'] = df_edited.loc[index, 'Random Sample']
-        st.session_state.df = df
+        # write back only the rows the visitor changed in one update, a value set back to the shared df's value
+        # stays in the overlay and applies as a no op
+        edited_samples = df_edited['Random Sample']
+        changed = edited_samples.index[edited_samples.ne(df_filtered.loc[edited_samples.index, 'Random Sample'])]
+        overlay.update(edited_samples.loc[changed].astype(bool).to_dict())
 
         # Plotly histograms
         # df_histogram = df_edited[df_edited['Random Sample']]
@@ -605,11 +2235,20 @@ class WebPages:
         # fig = px.histogram(df_histogram, x="Species", nbins=50)  # nbins = number of bars
         # st.plotly_chart(fig)
 
+        # manifest of the samples for every species
+        edits = pd.Series(overlay, dtype=bool)
+        sampled = df.index[df['Random Sample'].to_numpy()].difference(edits.index[~edits.to_numpy()])
+        samples = df.loc[sampled.union(edits.index[edits.to_numpy()])].drop(columns=['Random Sample'])
+        samples = samples.assign(**{'Image Link': self.url_prefix_archive + samples['Image Name'].astype(str)})
+        st.download_button(f'Download Test Set Manifest ({len(samples)} images, '
+                           f'{samples["Species"].nunique()} species)',
+                           data=samples.sort_values(['Species', 'DateTime']).to_csv(),
+                           file_name=f'model_test_manifest_seed_{st.session_state.get("sample_seed", seed)}.csv',
+                           mime='text/csv')
+
         # publish images
         self.image_names = df_edited[df_edited['Random Sample']]['Image Name'].tolist()
-        num_of_rows = math.ceil(len(self.image_names) / self.num_image_cols)
-        for row in range(num_of_rows):
-            self.publish_row_of_images(starting_col=row * 5, url_prefix=self.url_prefix_archive)
+        self.publish_image_gallery('sample_gallery', url_prefix=self.url_prefix_archive, thumbnail_size=THUMBNAIL_SIZE)
         return
 
     def about_page(self) -> None:
@@ -618,6 +2257,9 @@ class WebPages:
         :return: None
         """
         st.write('About Page')
+        data = self.shared_data(load=False)  # use the dates with data if another page has loaded it
+        if data is not None and len(data.dates) > 0:  # no days loaded, keep the requested dates
+            data.apply(self)
         st.write(f'This site display data for the the days from '
                  f'{min(self.available_dates)} to {max(self.available_dates)}')
         st.write(f'Data is sent from a rasp pi 4 running custom motion detection and image recognition software. '
@@ -642,3 +2284,33 @@ class WebPages:
                  f'https://github.com/JimMaastricht5/birdclassifier and'
                  f' https://github.com/JimMaastricht5/tweetersp')
         return
+
+    def diagnostics_page(self) -> None:
+        """
+        shows the stage timings, cache sizes, and background refresh status for this process.  turned on with the
+        TWEETERS_DIAGNOSTICS=1 environment variable
+        :return: None
+        """
+        st.set_page_config(layout="wide")
+        st.header('Tweeters Web Page: Diagnostics')
+        if not DIAGNOSTICS_ENABLED:
+            st.write('Diagnostics are turned off for this site.')
+            return
+        if st.sidebar.button('Reset timings'):
+            TIMINGS.reset()
+        st.write(f'Wall time percentiles over the last {TIMING_WINDOW} calls of each stage, counters are totals '
+                 f'for the process.  Cache hits, revalidations, and parsed rows are counted by read_csv_cached, '
+                 f'bytes by fetch.')
+        st.dataframe(TIMINGS.summary(), use_container_width=True, hide_index=True)
+        st.write('Caches')
+        st.dataframe(pd.DataFrame([
+            {'cache': 'data', 'entries': len(DATA_CACHE), 'MB': DATA_CACHE.total_bytes / 2 ** 20,
+             'max MB': DATA_CACHE.max_bytes / 2 ** 20},
+            {'cache': 'thumbnails', 'entries': len(THUMBNAIL_CACHE), 'MB': THUMBNAIL_CACHE.total_bytes / 2 ** 20,
+             'max MB': THUMBNAIL_CACHE.max_bytes / 2 ** 20}]), hide_index=True)
+        st.write('Background refresh')
+        st.dataframe(pd.DataFrame([{'url prefix': prefix, 'running': refresher.is_alive(),
+                                    'interval s': refresher.interval, 'refreshes': refresher.refresh_count}
+                                   for prefix, refresher in REFRESHERS.items()],
+                                  columns=['url prefix', 'running', 'interval s', 'refreshes']), hide_index=True)
+        return
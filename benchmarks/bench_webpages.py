@@ -0,0 +1,340 @@
+# MIT License
+#
+# 2024 Jim Maastricht
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# JimMaastricht5@gmail.com
+# benchmark for the WebPages data handling.  generates synthetic feeder files at a chosen scale, serves them from a
+# local http server with the same url layout as the storage bucket, and times each stage of loading, filtering,
+# and chart building.  run from the repo root, e.g.,
+#   python benchmarks/bench_webpages.py --events-per-day 5000 --days 7 --repeat 5
+# results print as a table, --json writes them to a file for comparing runs.  after the timed runs rows are appended
+# to today's file to check the incremental range reads, the script stops with an AssertionError if they are wrong
+import argparse
+import functools
+import http.server
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # repo root for WebClass
+
+
+def species_labels(num_species: int) -> list:
+    """
+    synthetic species labels in the classifier format, scientific name followed by the common name in parens
+    :param num_species: number of species
+    :return: list of labels
+    """
+    return [f'Genus{i} species{i} (Bird {i:03d})' for i in range(num_species)]
+
+
+def random_times(rng: np.random.Generator, day: str, size: int) -> np.ndarray:
+    """
+    sorted random times during feeder hours for a day
+    :param rng: numpy random generator
+    :param day: date string in the format yyyy-mm-dd
+    :param size: number of times
+    :return: array of date time strings
+    """
+    seconds = np.sort(rng.integers(5 * 3600, 20 * 3600, size))  # feeder is active from about 5am to 8pm
+    return (pd.Timestamp(day) + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%d %H:%M:%S').to_numpy()
+
+
+def generate_data(directory: str, events_per_day: int, feeders: int, num_species: int, days: int, years: int,
+                  archive_rows: int, seed: int = 1) -> list:
+    """
+    write the synthetic bucket files, day files end today in the feeder time zone
+    :param directory: output directory
+    :param events_per_day: occurrences per day, the message stream has the same number of rows
+    :param feeders: number of feeders
+    :param num_species: number of species
+    :param days: number of day files
+    :param years: years of daily history
+    :param archive_rows: rows in the archive image list
+    :param seed: random seed so runs are repeatable
+    :return: list of dates written, most recent first
+    """
+    rng = np.random.default_rng(seed)
+    labels = np.array(species_labels(num_species))
+    feeder_names = np.array([f'feeder{i}' for i in range(feeders)])
+    today = datetime.now(pytz.timezone('America/Chicago'))
+    dates = [(today - timedelta(days=day)).strftime('%Y-%m-%d') for day in range(days)]
+    for date in dates:
+        species = labels[rng.integers(0, num_species, events_per_day)]
+        pd.DataFrame({'Feeder Name': feeder_names[rng.integers(0, feeders, events_per_day)], 'Species': species,
+                      'Date Time': random_times(rng, date, events_per_day)}) \
+            .to_csv(os.path.join(directory, date + 'web_occurrences.csv'))
+        message_types = np.array(['spotted', 'possible', 'message'])[rng.integers(0, 3, events_per_day)]
+        image_names = np.char.add(np.char.add(f'{date}-', np.arange(events_per_day).astype(str)), '.gif')
+        pd.DataFrame({'Feeder Name': feeder_names[rng.integers(0, feeders, events_per_day)],
+                      'Event Num': np.arange(events_per_day), 'Message Type': message_types,
+                      'Date Time': random_times(rng, date, events_per_day),
+                      'Message': np.char.add(species.astype(str), ' spotted at the feeder'),
+                      'Image Name': np.where(message_types == 'message', '', image_names)}) \
+            .to_csv(os.path.join(directory, date + 'webstream.csv'))
+    history_dates = pd.date_range(end=today.strftime('%Y-%m-%d'), periods=365 * years)
+    common_names = np.array([label.split('(')[1][:-1] for label in labels])
+    pd.DataFrame({'Year': np.repeat(history_dates.year, num_species).astype(float),
+                  'Month': np.repeat(history_dates.month, num_species).astype(float),
+                  'Day': np.repeat(history_dates.day, num_species).astype(float),
+                  'Common Name': np.tile(common_names, len(history_dates)),
+                  'counts': rng.poisson(20, len(history_dates) * num_species)}) \
+        .to_csv(os.path.join(directory, 'daily_history.csv'))
+    archive_times = pd.Timestamp('2023-06-01') + pd.to_timedelta(rng.integers(0, 2 * 365 * 86400, archive_rows),
+                                                                 unit='s')
+    pd.DataFrame({'Year': archive_times.year, 'Month': archive_times.month, 'Day': archive_times.day,
+                  'Hour': archive_times.hour, 'DateTime': archive_times.strftime('%Y-%m-%d %H:%M:%S'),
+                  'Species': common_names[rng.integers(0, num_species, archive_rows)],
+                  'Image Name': archive_times.strftime('%Y-%m-%d-%H-%M-') + pd.Index(np.arange(archive_rows))
+                  .astype(str).str.zfill(3) + '.jpg'}) \
+        .to_csv(os.path.join(directory, 'archive-jpg-list.csv'), index_label='Image Number')
+    return dates
+
+
+class BucketHandler(http.server.SimpleHTTPRequestHandler):
+    """
+    static file handler that answers like the bucket for the requests WebClass makes, an etag for conditional gets
+    and open ended byte ranges, e.g., bytes=1024-, for the incremental reads.  no per request log lines
+    """
+    def log_message(self, format, *args) -> None:
+        return
+
+    def do_GET(self) -> None:
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        stat = os.stat(path)
+        etag = f'"{stat.st_mtime_ns}-{stat.st_size}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        start = 0
+        byte_range = self.headers.get('Range', '')
+        if byte_range.startswith('bytes='):
+            start = int(byte_range[len('bytes='):].split('-')[0])
+            if start >= len(body):  # nothing past the end of the file
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(body)}')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+        else:
+            self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+
+def start_server(directory: str) -> http.server.ThreadingHTTPServer:
+    """
+    serve a directory on a free local port in a background thread, answers get, head, conditional, and range
+    requests like the bucket
+    :param directory: directory to serve
+    :return: running server, the url prefix is http://127.0.0.1:<port>/
+    """
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(BucketHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def time_stage(results: dict, stage: str, function, *args, **kwargs):
+    """
+    run a function, add its wall time to the results for a stage
+    :param results: dict of stage name: list of seconds
+    :param stage: stage name
+    :param function: function to run
+    :return: function result
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    results.setdefault(stage, []).append(time.perf_counter() - start)
+    return result
+
+
+def run_once(WebClass, url_prefix: str, num_days: int, archive_file: str, results: dict, cold: bool) -> None:
+    """
+    time one pass over every stage
+    :param WebClass: imported WebClass module
+    :param url_prefix: local server url prefix
+    :param num_days: days of feeder files to load
+    :param archive_file: path of the archive image list
+    :param results: dict of stage name: list of seconds
+    :param cold: True to clear the process cache and snapshots first so the loaders download and parse everything
+    :return: None
+    """
+    if cold:
+        WebClass.DATA_CACHE.clear()
+        shutil.rmtree(WebClass.SNAPSHOT_DIR, ignore_errors=True)
+    prefix = 'cold ' if cold else 'warm '
+    webpage = WebClass.WebPages(url_prefix=url_prefix, num_days=num_days)
+    time_stage(results, prefix + 'fetch_day_files', webpage.fetch_day_files, ['web_occurrences.csv', 'webstream.csv'])
+    webpage.df_occurrences = time_stage(results, prefix + 'load_bird_occurrences', webpage.load_bird_occurrences)
+    webpage.birds = webpage.df_occurrences['Common Name'].unique()
+    webpage.df_msg_stream = time_stage(results, prefix + 'load_message_stream', webpage.load_message_stream)
+    time_stage(results, prefix + 'load_daily_history', webpage.load_daily_history)
+    time_stage(results, prefix + 'load_archive_list', webpage.load_archive_list, archive_file)
+    if cold:  # the remaining stages do not touch the cache
+        return
+    df_raw = webpage.fetch_day_files(['webstream.csv'])[('webstream.csv', webpage.dates[0])]  # cached day
+    time_stage(results, 'build_common_name', webpage.build_common_name, df_raw.copy(), 'Message')
+    feeders, dates, birds = list(webpage.feeders), list(webpage.dates), ['All']
+    webpage.occurrences_index = webpage.msg_stream_index = None  # include the index build in the first filter
+    df = time_stage(results, 'filter_occurrences', webpage.filter_occurrences, feeders, dates[:1], birds)
+    time_stage(results, 'filter_occurrences all dates', webpage.filter_occurrences, feeders, dates, birds)
+    time_stage(results, 'filter_message_stream', webpage.filter_message_stream, feeders, dates, birds,
+               ['Animated', 'Static'])
+    time_stage(results, 'occurrence_bar_chart', webpage.occurrence_bar_chart, df, 'Date Time',
+               webpage.date_time_bin_width(df['Date Time'], WebClass.CHART_NBINS))
+    trends = time_stage(results, 'trends engine', WebClass.TrendsEngine, webpage.shared_history())
+    df_trend = time_stage(results, 'trends series auto', trends.series)
+    time_stage(results, 'trends line chart', WebClass.px.line, df_trend, x='Year-Day', y='counts',
+               color='Common Name', render_mode='webgl')
+    return
+
+
+def check_append_reload(WebClass, url_prefix: str, bucket_dir: str, results: dict, num_rows: int = 100) -> None:
+    """
+    append rows to today's message stream and check each reload against a full parse of the file: new rows are
+    read with a range request, a partial last line waits for the next read, an unchanged file is not parsed again,
+    and a file replaced by a smaller one is read from the start
+    :param WebClass: imported WebClass module
+    :param url_prefix: local server url prefix
+    :param bucket_dir: directory the server reads from
+    :param results: dict of stage name: list of seconds
+    :param num_rows: rows to append
+    :return: None
+    """
+    webpage = WebClass.WebPages(url_prefix=url_prefix, num_days=1)
+    today = webpage.dates[0]
+    path = os.path.join(bucket_dir, today + 'webstream.csv')
+    key = (url_prefix + today + 'webstream.csv', today)
+
+    def reload(stage: str) -> pd.DataFrame:
+        WebClass.DATA_CACHE.expire(key)  # as the background refresh does
+        return time_stage(results, stage, webpage.fetch_day_files, ['webstream.csv'])[('webstream.csv', today)]
+
+    def check(df: pd.DataFrame, stage: str) -> None:
+        expected = webpage.prepare_message_stream(pd.read_csv(path))
+        pd.testing.assert_frame_equal(df.reset_index(drop=True), expected, check_dtype=False, obj=stage)
+
+    df_before = reload('append: first read')
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines(keepends=True)
+    with open(path, 'ab') as f:  # whole rows plus the first half of one more row
+        f.write(b''.join(lines[-num_rows:]) + lines[1][:len(lines[1]) // 2])
+    df_appended = reload('append: range read')
+    assert len(df_appended) == len(df_before) + num_rows, 'appended rows were not read'
+    with open(path, 'ab') as f:  # finish the partial row
+        f.write(lines[1][len(lines[1]) // 2:])
+    df_completed = reload('append: finish partial row')
+    check(df_completed, 'append: finish partial row')
+    assert reload('append: unchanged') is df_completed, 'unchanged file was parsed again'
+    with open(path, 'wb') as f:  # replaced by a smaller file, the range request is past the end
+        f.write(b''.join(lines[:len(lines) // 2]))
+    check(reload('append: replaced file'), 'append: replaced file')
+    print('append and reload checks passed')
+    return
+
+
+def summarize(results: dict) -> list:
+    """
+    median, min, and max seconds for each stage
+    :param results: dict of stage name: list of seconds
+    :return: list of dicts, one per stage
+    """
+    return [{'stage': stage, 'runs': len(seconds), 'median_ms': statistics.median(seconds) * 1000,
+             'min_ms': min(seconds) * 1000, 'max_ms': max(seconds) * 1000} for stage, seconds in results.items()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='benchmark WebPages loading, filtering, and charts')
+    parser.add_argument('--events-per-day', type=int, default=2000, help='occurrences and messages per day')
+    parser.add_argument('--feeders', type=int, default=2)
+    parser.add_argument('--species', type=int, default=30)
+    parser.add_argument('--days', type=int, default=3, help='days of feeder files')
+    parser.add_argument('--years', type=int, default=2, help='years of daily history')
+    parser.add_argument('--archive-rows', type=int, default=75000)
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each stage, the median is reported')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='optional file to write the results to')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='tweeters_bench_')
+    bucket_dir = os.path.join(work_dir, 'bucket')
+    os.makedirs(bucket_dir)
+    # configure WebClass before it is imported, snapshots in the work dir and no background refresh
+    os.environ['TWEETERS_SNAPSHOT_DIR'] = os.path.join(work_dir, 'snapshots')
+    os.environ['TWEETERS_REFRESH_SECONDS'] = '0'
+    start = time.perf_counter()
+    generate_data(bucket_dir, args.events_per_day, args.feeders, args.species, args.days, args.years,
+                  args.archive_rows, args.seed)
+    print(f'generated data in {time.perf_counter() - start:.1f}s at {bucket_dir}')
+    start = time.perf_counter()
+    import WebClass  # noqa: E402 import timed on purpose
+    import_seconds = time.perf_counter() - start
+    server = start_server(bucket_dir)
+    url_prefix = f'http://127.0.0.1:{server.server_address[1]}/'
+    archive_file = os.path.join(bucket_dir, 'archive-jpg-list.csv')
+
+    results = {'import WebClass': [import_seconds]}
+    try:
+        for _ in range(args.repeat):
+            run_once(WebClass, url_prefix, args.days, archive_file, results, cold=True)
+            run_once(WebClass, url_prefix, args.days, archive_file, results, cold=False)
+        check_append_reload(WebClass, url_prefix, bucket_dir, results)
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    summary = summarize(results)
+    print(f'{"stage":32} {"runs":>4} {"median ms":>10} {"min ms":>10} {"max ms":>10}')
+    for row in summary:
+        print(f'{row["stage"]:32} {row["runs"]:>4} {row["median_ms"]:>10.1f} {row["min_ms"]:>10.1f} '
+              f'{row["max_ms"]:>10.1f}')
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'python': platform.python_version(), 'pandas': pd.__version__,
+                       'cache_bytes': WebClass.DATA_CACHE.total_bytes,
+                       'stages': summary}, f, indent=2)
+    return
+
+
+if __name__ == '__main__':
+    main()